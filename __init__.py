@@ -2,13 +2,14 @@ bl_info = {
     "name": "AutoLow",
     "author": "Daniel Boxer",
     "version": (1, 0),
-    "blender": (3, 0, 0),
+    "blender": (3, 2, 0),
     "location": "View3D > Sidebar > AutoLow",
     "description": "Automated high to low poly workflow",
     "category": "Mesh",
 }
 
 import bpy
+from . import autolow_progress as progress
 from .autolow_ui import (
     AUTOLOW_PT_main,
     AUTOLOW_PT_workflow,
@@ -19,14 +20,24 @@ from .autolow_ui import (
     AUTOLOW_PT_queue,
     AUTOLOW_PT_settings,
     AUTOLOW_PT_save_image,
+    AUTOLOW_PT_export,
     AUTOLOW_PT_autosave,
+    AUTOLOW_PT_stats,
+    AUTOLOW_PT_export_stats,
+    AUTOLOW_PT_cache,
+    AUTOLOW_PT_limits,
+    AUTOLOW_PT_parallel,
     AUTOLOW_UL_queue_items,
 )
 from .autolow_op import (
     AUTOLOW_OT_start,
     AUTOLOW_OT_set_workflow,
+    AUTOLOW_OT_pack_atlas,
+    AUTOLOW_OT_estimate,
+    AUTOLOW_OT_cancel,
     AUTOLOW_OT_open_filebrowser,
     AUTOLOW_OT_queue_actions,
+    AUTOLOW_OT_queue_add,
 )
 from .autolow_props import (
     AUTOLOW_PG_properties,
@@ -44,11 +55,21 @@ classes = (
     AUTOLOW_PT_queue,
     AUTOLOW_PT_settings,
     AUTOLOW_PT_save_image,
+    AUTOLOW_PT_export,
     AUTOLOW_PT_autosave,
+    AUTOLOW_PT_stats,
+    AUTOLOW_PT_export_stats,
+    AUTOLOW_PT_cache,
+    AUTOLOW_PT_limits,
+    AUTOLOW_PT_parallel,
     AUTOLOW_UL_queue_items,
     AUTOLOW_OT_start,
     AUTOLOW_OT_set_workflow,
     AUTOLOW_OT_queue_actions,
+    AUTOLOW_OT_queue_add,
+    AUTOLOW_OT_pack_atlas,
+    AUTOLOW_OT_estimate,
+    AUTOLOW_OT_cancel,
     AUTOLOW_OT_open_filebrowser,
     AUTOLOW_PG_properties,
     AUTOLOW_PG_queue_properties,
@@ -65,9 +86,11 @@ def register():
         type=AUTOLOW_PG_queue_properties
     )
     bpy.types.Scene.queue_index = bpy.props.IntProperty(name="Object Index")
+    bpy.app.handlers.load_pre.append(progress.on_load_pre)
 
 
 def unregister():
+    bpy.app.handlers.load_pre.remove(progress.on_load_pre)
     del bpy.types.Scene.queue_index
     del bpy.types.Scene.queue
     del bpy.types.Scene.autolow_props
@@ -0,0 +1,193 @@
+import bpy
+import json
+import sys
+import time
+import traceback
+import pathlib
+from .autolow_main import process_object
+from .autolow_utils import (
+    get_props,
+    check_object,
+    get_baked_images,
+    flush_images,
+    override_settings,
+    AutolowError,
+)
+from . import autolow_stats as stats
+
+
+# headless batch runner
+#
+# usage:
+# blender -b --addons AutoLow --python-expr "import AutoLow.autolow_batch as b; b.main()"
+#     -- manifest.json results.jsonl
+#
+# manifest format:
+# {
+#     "settings": {"remesher": "VOXEL", "resolution": "2048"},
+#     "assets": [
+#         {
+#             "file": "scan_01.blend",
+#             "objects": ["Scan"],
+#             "settings": {"remesh_percent": 10},
+#             "object_settings": {"Scan": {"resolution": "4096"}},
+#             "save_as": "scan_01_low.blend",
+#             "pack_images": false
+#         }
+#     ]
+# }
+#
+# one json line is written to the results file for every object, and one with
+# "object": null if an asset fails after all its objects finished
+
+
+def main():
+    # arguments after "--" are passed to the script by blender
+    argv = sys.argv
+    argv = argv[argv.index("--") + 1 :] if "--" in argv else []
+    if len(argv) < 1:
+        print("AutoLow: usage: -- manifest.json [results.jsonl]")
+        sys.exit(2)
+
+    manifest_path = argv[0]
+    results_path = argv[1] if len(argv) > 1 else None
+    failed = run_batch(manifest_path, results_path)
+    sys.exit(1 if failed else 0)
+
+
+def run_batch(manifest_path, results_path=None):
+    manifest_path = pathlib.Path(manifest_path)
+    with open(manifest_path) as file:
+        manifest = json.load(file)
+
+    if results_path is None:
+        results_path = manifest_path.with_suffix(".results.jsonl")
+
+    failed = 0
+    with open(results_path, "w") as results:
+        for asset in manifest.get("assets", []):
+            # records are found by object name, which files can reuse
+            stats.reset()
+            settings = dict(manifest.get("settings", {}))
+            settings.update(asset.get("settings", {}))
+            # relative paths are relative to the manifest
+            blend_path = manifest_path.parent / asset.get("file", "")
+
+            done = set()
+            try:
+                for result in process_asset(blend_path, asset, settings):
+                    done.add(result["object"])
+                    failed += write_result(results, result)
+            except Exception as error:
+                # the other assets still run, the objects of this one that
+                # have no result fail
+                traceback.print_exc()
+                names = asset.get("objects", [])
+                missing = [name for name in names if name not in done]
+                for name in missing:
+                    result = new_result(blend_path, name, error=str(error))
+                    failed += write_result(results, result)
+                if not missing:
+                    # every object has a result, the asset itself failed,
+                    # like when saving
+                    result = new_result(blend_path, None, error=str(error))
+                    failed += write_result(results, result)
+
+    return failed
+
+
+def write_result(results, result):
+    # results are written right away so a crash keeps the finished ones,
+    # returns 1 for failed results
+    results.write(json.dumps(result) + "\n")
+    results.flush()
+    return 0 if result["status"] == "ok" else 1
+
+
+def process_asset(blend_path, asset, settings):
+    try:
+        bpy.ops.wm.open_mainfile(filepath=str(blend_path))
+        apply_settings(settings)
+    except Exception as error:
+        for name in asset.get("objects", []):
+            yield new_result(blend_path, name, error=str(error))
+        return
+
+    lowpolys = []
+    object_settings = asset.get("object_settings", {})
+    for name in asset.get("objects", []):
+        # settings of single objects only apply while they are processed
+        try:
+            with override_settings(object_settings.get(name, {})):
+                result = process_asset_object(blend_path, name)
+        except Exception as error:
+            result = new_result(blend_path, name, error=str(error))
+        if result["status"] == "ok":
+            lowpolys.append(bpy.data.objects[result["lowpoly"]])
+        yield result
+
+    # images must be on disk before the file is saved
+    for error in flush_images():
+        print("AutoLow: image couldn't be saved: " + error)
+
+    save_as = asset.get("save_as")
+    if save_as:
+        if asset.get("pack_images"):
+            # keep images that weren't saved to disk inside the saved file
+            for lowpoly in lowpolys:
+                for image in get_baked_images(lowpoly):
+                    if image.filepath_raw == "" and not image.packed_file:
+                        image.pack()
+        save_path = blend_path.parent / save_as
+        bpy.ops.wm.save_as_mainfile(filepath=str(save_path))
+
+
+def process_asset_object(blend_path, name):
+    highpoly = bpy.data.objects.get(name)
+    if highpoly is None:
+        error = "Object '" + name + "' not found"
+    else:
+        error = check_object(highpoly)
+    if error is not None:
+        return new_result(blend_path, name, error=error)
+
+    start = time.perf_counter()
+    faces_in = len(highpoly.data.polygons)
+    try:
+        lowpoly, *lods = process_object(highpoly)
+    except Exception as error:
+        # one broken object must not stop the whole manifest
+        traceback.print_exc()
+        return new_result(blend_path, name, error=str(error))
+
+    result = new_result(blend_path, name)
+    result["lowpoly"] = lowpoly.name
+    result["lods"] = [lod.name for lod in lods]
+    result["faces_in"] = faces_in
+    result["faces_out"] = len(lowpoly.data.polygons)
+    result["images"] = [
+        bpy.path.abspath(image.filepath_raw) for image in get_baked_images(lowpoly)
+    ]
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    result["stages"] = stats.get_object_records(name)
+    return result
+
+
+def apply_settings(settings):
+    props = get_props()
+    for key, value in settings.items():
+        if key not in props.bl_rna.properties:
+            raise AutolowError("Unknown setting '" + key + "'")
+        setattr(props, key, value)
+
+    # batch runs never open the save dialog
+    props.autosave = False
+
+
+def new_result(blend_path, name, error=None):
+    return {
+        "file": str(blend_path),
+        "object": name,
+        "status": "ok" if error is None else "error",
+        "error": error,
+    }
@@ -0,0 +1,313 @@
+import bpy
+import hashlib
+import numpy as np
+import os
+import pathlib
+import shutil
+import tempfile
+from .autolow_utils import (
+    get_props,
+    get_image_dir,
+    get_unique_image_name,
+    remove_object,
+)
+
+
+# on disk cache for remesh and bake results
+# every entry is a folder named after its key, the folder's modification time
+# is used as the last access time for LRU eviction
+
+CACHE_VERSION = "2"
+
+REMESH_FIELDS = (
+    "remesher",
+    "remesh_percent",
+    "remesh_target",
+    "target_triangles",
+    "target_error",
+    "max_trials",
+    "voxel_estimate",
+    "samples",
+    "detail_method",
+    "detail_level",
+)
+BAKE_FIELDS = (
+    "remesher",
+    "detail_method",
+    "detail_level",
+    "bake_method",
+    "bake_engine",
+    "cage_settings",
+    "extrusion",
+    "ray_distance",
+    "resolution",
+    "sample_mode",
+    "max_samples",
+    "noise_threshold",
+    "is_tiled_bake",
+    "use_async_save",
+    "use_16_bit",
+    "use_exr_normals",
+)
+
+
+def hash_mesh(mesh, use_uvs=False):
+    # hash of the geometry read in bulk
+    digest = hashlib.sha1()
+    for collection, attribute, dtype, size in (
+        (mesh.vertices, "co", np.float32, 3),
+        (mesh.polygons, "loop_total", np.int32, 1),
+        (mesh.loops, "vertex_index", np.int32, 1),
+    ):
+        data = np.empty(len(collection) * size, dtype=dtype)
+        collection.foreach_get(attribute, data)
+        digest.update(data.tobytes())
+
+    if use_uvs and mesh.uv_layers.active is not None:
+        uvs = mesh.uv_layers.active.data
+        data = np.empty(len(uvs) * 2, dtype=np.float32)
+        uvs.foreach_get("uv", data)
+        digest.update(data.tobytes())
+
+    return digest.hexdigest()
+
+
+def hash_object(obj, use_uvs=False):
+    # hash of the mesh with all modifiers applied
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    evaluated = obj.evaluated_get(depsgraph)
+    mesh = evaluated.to_mesh()
+    try:
+        return hash_mesh(mesh, use_uvs)
+    finally:
+        evaluated.to_mesh_clear()
+
+
+def hash_materials(materials):
+    # hash of the settings and node trees of the materials, so an edited
+    # material doesn't use maps baked from the old one
+    digest = hashlib.sha1()
+    for material in materials:
+        if material is None:
+            digest.update(b"None")
+            continue
+        digest.update(material.name.encode())
+        for attribute in ("diffuse_color", "roughness", "metallic"):
+            digest.update(str(tuple_value(getattr(material, attribute))).encode())
+        if material.use_nodes and material.node_tree is not None:
+            hash_node_tree(material.node_tree, digest, set())
+    return digest.hexdigest()
+
+
+def hash_node_tree(tree, digest, seen):
+    # node groups are hashed once even if they are used many times
+    if tree.name in seen:
+        return
+    seen.add(tree.name)
+    base_properties = {prop.identifier for prop in bpy.types.Node.bl_rna.properties}
+    for node in sorted(tree.nodes, key=lambda node: node.name):
+        digest.update((node.bl_idname + node.name).encode())
+        for prop in node.bl_rna.properties:
+            if prop.identifier in base_properties:
+                continue
+            value = getattr(node, prop.identifier)
+            if isinstance(value, bpy.types.Image):
+                digest.update(hash_image(value).encode())
+            elif isinstance(value, bpy.types.NodeTree):
+                hash_node_tree(value, digest, seen)
+            elif prop.type in {"BOOLEAN", "INT", "FLOAT", "STRING", "ENUM"}:
+                digest.update(str(tuple_value(value)).encode())
+        for socket in node.inputs:
+            if hasattr(socket, "default_value"):
+                digest.update(str(tuple_value(socket.default_value)).encode())
+    for link in tree.links:
+        digest.update(
+            (
+                link.from_node.name
+                + link.from_socket.identifier
+                + link.to_node.name
+                + link.to_socket.identifier
+            ).encode()
+        )
+
+
+def hash_image(image):
+    # the file and its modification time, packed and generated images by name
+    path = bpy.path.abspath(image.filepath_raw)
+    if image.packed_file is None and os.path.isfile(path):
+        return path + str(os.path.getmtime(path))
+    return image.name + str(image.is_dirty)
+
+
+def tuple_value(value):
+    # arrays of properties are compared by their values
+    if isinstance(value, str):
+        return value
+    try:
+        return tuple(value)
+    except TypeError:
+        return value
+
+
+def make_key(*parts, fields=()):
+    props = get_props()
+    digest = hashlib.sha1(CACHE_VERSION.encode())
+    for part in parts:
+        digest.update(str(part).encode())
+    for field in fields:
+        digest.update((field + "=" + str(getattr(props, field))).encode())
+    return digest.hexdigest()
+
+
+def remesh_key(highpoly):
+    # the remesh applies the modifiers of the highpoly
+    return make_key("remesh", hash_object(highpoly, use_uvs=True), fields=REMESH_FIELDS)
+
+
+def bake_keys(highpoly, lowpoly, map_names):
+    # hash the meshes once for all maps
+    scene = bpy.context.scene
+    highpoly_hash = hash_object(highpoly, use_uvs=True)
+    lowpoly_hash = hash_object(lowpoly, use_uvs=True)
+    materials = hash_materials(highpoly.data.materials)
+    # bake settings of the scene that change the images
+    scene_settings = (scene.render.bake.margin, scene.cycles.samples)
+    return {
+        map_name: make_key(
+            "bake",
+            map_name,
+            highpoly_hash,
+            lowpoly_hash,
+            materials,
+            scene_settings,
+            fields=BAKE_FIELDS,
+        )
+        for map_name in map_names
+    }
+
+
+def get_cache_dir():
+    path = get_props().cache_path
+    if path == "":
+        path = pathlib.Path(tempfile.gettempdir()) / "autolow_cache"
+    else:
+        path = pathlib.Path(bpy.path.abspath(path))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def get_entry(key):
+    entry = get_cache_dir() / key
+    if not entry.is_dir():
+        return None
+    # mark entry as recently used
+    os.utime(entry)
+    return entry
+
+
+def store_entry(key, write):
+    # write into a temporary folder first so other processes never see
+    # half written entries
+    cache_dir = get_cache_dir()
+    temp = pathlib.Path(tempfile.mkdtemp(prefix=key + "_", dir=cache_dir))
+    try:
+        write(temp)
+        os.replace(temp, cache_dir / key)
+    except OSError:
+        # another process stored the same entry first
+        shutil.rmtree(temp, ignore_errors=True)
+    evict()
+
+
+def evict():
+    # remove least recently used entries until the cache fits its size cap
+    max_size = get_props().cache_size * 1024 * 1024
+    entries = []
+    total = 0
+    for entry in get_cache_dir().iterdir():
+        if not entry.is_dir():
+            continue
+        size = sum(file.stat().st_size for file in entry.iterdir())
+        entries.append((entry.stat().st_mtime, size, entry))
+        total += size
+
+    entries.sort()
+    for _, size, entry in entries:
+        if total <= max_size:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+
+
+def load_remesh(key, lowpoly):
+    # replace lowpoly with the cached result and return the new object
+    entry = get_entry(key)
+    if entry is None:
+        return None
+
+    with bpy.data.libraries.load(str(entry / "lowpoly.blend")) as (
+        data_from,
+        data_to,
+    ):
+        data_to.objects = data_from.objects[:1]
+    cached = data_to.objects[0]
+    if cached is None:
+        return None
+
+    # use the materials of this file instead of the appended copies
+    for index, material in enumerate(lowpoly.data.materials):
+        if index < len(cached.data.materials):
+            cached.data.materials[index] = material
+
+    name = lowpoly.name
+    cached.matrix_world = lowpoly.matrix_world
+    for collection in lowpoly.users_collection:
+        collection.objects.link(cached)
+    # the copy of the highpoly mesh isn't needed anymore
+    remove_object(lowpoly)
+    cached.name = name
+    return cached
+
+
+def store_remesh(key, lowpoly):
+    def write(folder):
+        bpy.data.libraries.write(str(folder / "lowpoly.blend"), {lowpoly})
+
+    store_entry(key, write)
+
+
+def load_image(key, name, non_color=False):
+    entry = get_entry(key)
+    if entry is None:
+        return None
+
+    cached_path = next(entry.glob("image.*"), None)
+    if cached_path is None:
+        return None
+    # numbered like new maps, so no saved map is overwritten
+    name = get_unique_image_name(name)
+    if get_props().is_image_saved:
+        # copy into the image folder so the image doesn't depend on the cache
+        path = pathlib.Path(get_image_dir()) / (name + cached_path.suffix)
+        shutil.copyfile(cached_path, path)
+        image = bpy.data.images.load(str(path))
+    else:
+        image = bpy.data.images.load(str(cached_path))
+        image.pack()
+    image.name = name
+    if non_color:
+        image.colorspace_settings.name = "Non-Color"
+    return image
+
+
+def store_image(key, image):
+    # only images that were saved to disk are cached
+    saved_path = bpy.path.abspath(image.filepath_raw)
+    if image.filepath_raw == "" or not os.path.isfile(saved_path):
+        return
+
+    def write(folder):
+        suffix = pathlib.Path(saved_path).suffix
+        shutil.copyfile(saved_path, folder / ("image" + suffix))
+
+    store_entry(key, write)
@@ -0,0 +1,157 @@
+import bpy
+import numpy as np
+from .autolow_main import BAKE_MAPS
+from .autolow_utils import (
+    get_props,
+    check_topology,
+    get_edge_lengths,
+    get_world_vertices,
+    BASE_SAMPLES,
+    NOISY_BAKE_TYPES,
+)
+
+
+# pre-flight analysis of the queue and a rough cost estimate for every stage
+
+# seconds and bytes for one unit of work of a stage on one cpu
+# the units are in the comments, the numbers are rough averages
+COSTS = {
+    # faces in and out
+    "voxel_remesh": (3e-6, 500),
+    # faces in
+    "quadriflow": (4e-5, 2000),
+    # faces in
+    "decimate": (3e-6, 300),
+    # subdivided faces
+    "multires": (1e-6, 250),
+    # lowpoly vertices
+    "project": (2e-5, 100),
+    # lowpoly faces
+    "smart_project": (3e-5, 500),
+    "seam_unwrap": (8e-6, 400),
+    # texels times samples
+    "bake_cycles": (4e-8, 0),
+    # texels
+    "bake_hitbuffer": (4e-7, 80),
+    # texels
+    "save": (2e-8, 16),
+}
+
+# bytes of every face of a mesh that is held in memory
+MESH_BYTES = 250
+
+
+def analyze(obj):
+    # sizes and topology of an object read in bulk
+    mesh = obj.data
+    loop_totals = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("loop_total", loop_totals)
+    topology = check_topology(mesh)
+
+    matrix = np.array(obj.matrix_world, dtype=np.float32)
+    co, _ = get_world_vertices(mesh, matrix)
+    scale = float(np.linalg.norm(matrix[:3, :3], axis=0).mean())
+    edge_lengths = get_edge_lengths(mesh, 10000)
+
+    return {
+        "verts": len(mesh.vertices),
+        "faces": len(mesh.polygons),
+        "triangles": int((loop_totals - 2).sum()),
+        "is_manifold": topology["boundary_edges"] == 0
+        and topology["non_manifold_edges"] == 0
+        and topology["flipped_edges"] == 0,
+        "size": float(np.linalg.norm(co.max(axis=0) - co.min(axis=0)))
+        if len(co)
+        else 0.0,
+        "avg_edge_length": float(np.mean(edge_lengths)) * scale
+        if len(edge_lengths)
+        else 0.0,
+    }
+
+
+def estimate(analysis):
+    # estimated seconds and peak bytes of every stage of one object
+    props = get_props()
+    faces = analysis["faces"]
+    stages = []
+
+    def add(name, cost, units, held=0):
+        seconds, bytes_per_unit = COSTS[cost]
+        stages.append((name, seconds * units, bytes_per_unit * units + held))
+
+    lowpoly_faces = faces
+    remesher = props.remesher
+    if remesher != "NONE":
+        if props.remesh_target == "TRIANGLES":
+            lowpoly_faces = min(faces, props.target_triangles)
+        else:
+            lowpoly_faces = int(faces * props.remesh_percent / 100)
+        # a search runs a few trial remeshes
+        trials = props.max_trials if props.remesh_target != "PERCENT" else 1
+        held = faces * MESH_BYTES
+
+        if remesher == "VOXEL":
+            add("voxel_remesh", "voxel_remesh", (faces + lowpoly_faces) * trials, held)
+        elif remesher == "QUAD":
+            if not analysis["is_manifold"]:
+                add("voxel_remesh", "voxel_remesh", faces * 2, held)
+            add("quadriflow", "quadriflow", faces * trials, held)
+        else:
+            add("decimate", "decimate", faces * trials, held)
+
+        if props.detail_method == "PROJECT":
+            add("project", "project", lowpoly_faces, held)
+        elif props.detail_level > 0:
+            subdivided = lowpoly_faces * 4**props.detail_level
+            add("multires", "multires", subdivided, held)
+
+    if props.unwrap_method == "SMART":
+        add("smart_project", "smart_project", lowpoly_faces)
+    elif props.unwrap_method == "SEAMS":
+        add("seam_unwrap", "seam_unwrap", lowpoly_faces)
+
+    if props.bake_method != "NONE":
+        texels = int(props.resolution) ** 2
+        maps = [m for m in BAKE_MAPS if getattr(props, m.prop)]
+        # the same choice of engine as bake_steps
+        is_transfer = props.bake_method == "TRANSFER"
+        is_hitbuffer_engine = props.bake_engine == "HITBUFFER" and is_transfer
+        is_tiled = props.is_tiled_bake
+        # float rgba images
+        images = texels * 16 * len(maps)
+        for m in maps:
+            if m.is_traced and (is_hitbuffer_engine or is_tiled or not m.is_cycles):
+                add("bake_" + m.name, "bake_hitbuffer", texels, images)
+            else:
+                if props.sample_mode == "SCENE":
+                    samples = bpy.context.scene.cycles.samples
+                elif m.bake_type in NOISY_BAKE_TYPES:
+                    # noisy maps can take up to the most samples
+                    samples = props.max_samples
+                else:
+                    samples = BASE_SAMPLES.get(m.bake_type, 1)
+                add("bake_" + m.name, "bake_cycles", texels * samples, images)
+        if props.is_image_saved:
+            add("save", "save", texels * len(maps), images)
+
+    return stages
+
+
+def estimate_object(obj):
+    # total seconds and peak memory in megabytes
+    analysis = analyze(obj)
+    stages = estimate(analysis)
+    seconds = sum(stage[1] for stage in stages)
+    peak = max((stage[2] for stage in stages), default=0)
+    peak += analysis["faces"] * MESH_BYTES
+    return analysis, stages, seconds, peak / (1024 * 1024)
+
+
+def check_limits(seconds, memory):
+    # reason the estimate is over the limits, or None
+    props = get_props()
+    if props.max_minutes > 0 and seconds > props.max_minutes * 60:
+        return "estimated " + format(seconds / 60, ".1f") + " min"
+    if props.max_memory > 0 and memory > props.max_memory:
+        return "estimated " + format(memory, ".0f") + " MB"
+    return None
@@ -0,0 +1,676 @@
+import bpy
+import colorsys
+import numpy as np
+import sys
+from mathutils.bvhtree import BVHTree
+from .autolow_image_io import PNGStreamWriter
+
+
+# bake engine that traces the highpoly once per lowpoly texel and derives
+# every map from the shared hit buffer instead of running one cycles bake
+# per map
+
+# pixels of the lowpoly that are rasterized per batch
+BATCH_SIZE = 1 << 22
+
+# rays that are converted to python lists at a time for the bvh
+RAY_CHUNK = 1 << 16
+
+# most pixels of a band of the tiled bake, bands of big images get fewer rows
+MAX_BAND_PIXELS = 1 << 23
+
+# pixels of source textures, read once per bake
+source_pixels = {}
+
+
+class Surface:
+    # world space triangles of an evaluated mesh read in bulk
+    def __init__(self, obj, depsgraph, use_tangents=False):
+        obj_eval = obj.evaluated_get(depsgraph)
+        mesh = obj_eval.to_mesh()
+        try:
+            self.read(mesh, obj.matrix_world, use_tangents)
+        finally:
+            obj_eval.to_mesh_clear()
+
+    def read(self, mesh, matrix, use_tangents):
+        self.curvature = None
+        mesh.calc_loop_triangles()
+        uv_layer = mesh.uv_layers.active
+
+        self.tangents = None
+        if use_tangents and uv_layer is not None:
+            try:
+                mesh.calc_tangents(uvmap=uv_layer.name)
+            except RuntimeError:
+                # only tris and quads have tangents, they are estimated below
+                pass
+            else:
+                self.tangents = read_array(mesh.loops, "tangent", 3, np.float32)
+                self.signs = read_array(mesh.loops, "bitangent_sign", 1, np.float32)
+        if self.tangents is None and hasattr(mesh, "calc_normals_split"):
+            mesh.calc_normals_split()
+
+        self.tri_loops = read_array(mesh.loop_triangles, "loops", 3, np.int32)
+        self.tri_materials = read_array(
+            mesh.loop_triangles, "material_index", 1, np.int32
+        )
+        loop_verts = read_array(mesh.loops, "vertex_index", 1, np.int32)
+        self.tri_verts = loop_verts[self.tri_loops]
+
+        # transform to world space
+        matrix = np.array(matrix, dtype=np.float32)
+        normal_matrix = np.linalg.inv(matrix[:3, :3]).T
+        co = read_array(mesh.vertices, "co", 3, np.float32)
+        self.co = co @ matrix[:3, :3].T + matrix[:3, 3]
+        normals = read_array(mesh.loops, "normal", 3, np.float32)
+        self.normals = normalize(normals @ normal_matrix.T)
+        if self.tangents is not None:
+            self.tangents = normalize(self.tangents @ matrix[:3, :3].T)
+
+        self.uvs = None
+        if uv_layer is not None:
+            self.uvs = read_array(uv_layer.data, "uv", 2, np.float32)
+            if use_tangents and self.tangents is None:
+                self.estimate_tangents()
+
+    def estimate_tangents(self):
+        # one tangent per triangle from its uv gradient
+        p = self.co[self.tri_verts]
+        uv = self.uvs[self.tri_loops]
+        dp1, dp2 = p[:, 1] - p[:, 0], p[:, 2] - p[:, 0]
+        duv1, duv2 = uv[:, 1] - uv[:, 0], uv[:, 2] - uv[:, 0]
+        det = duv1[:, 0] * duv2[:, 1] - duv2[:, 0] * duv1[:, 1]
+        det[np.abs(det) < 1e-12] = 1e-12
+        tangent = (dp1 * duv2[:, 1:] - dp2 * duv1[:, 1:]) / det[:, None]
+        bitangent = (dp2 * duv1[:, :1] - dp1 * duv2[:, :1]) / det[:, None]
+        normal = np.cross(dp1, dp2)
+        sign = np.where(np.sum(np.cross(normal, tangent) * bitangent, 1) < 0, -1, 1)
+
+        self.tangents = np.empty_like(self.normals)
+        self.signs = np.empty(len(self.normals), dtype=np.float32)
+        for corner in range(3):
+            self.tangents[self.tri_loops[:, corner]] = normalize(tangent)
+            self.signs[self.tri_loops[:, corner]] = sign
+
+    def interpolate(self, values, tris, bary, per_vertex=False):
+        # barycentric interpolation of per loop or per vertex values
+        indices = self.tri_verts if per_vertex else self.tri_loops
+        corners = values[indices[tris]]
+        if corners.ndim == 2:
+            return np.sum(corners * bary, axis=1)
+        return np.sum(corners * bary[:, :, None], axis=1)
+
+    def build_bvh(self):
+        return BVHTree.FromPolygons(
+            self.co.tolist(), self.tri_verts.tolist(), all_triangles=True
+        )
+
+
+class HighpolySurface:
+    # surface and bvh of a highpoly, built when a stage first needs them and
+    # shared by every stage of the object
+    def __init__(self, obj):
+        self.obj = obj
+        self.surface = None
+        self.bvh = None
+
+    def get(self):
+        if self.surface is None:
+            depsgraph = bpy.context.evaluated_depsgraph_get()
+            self.surface = Surface(self.obj, depsgraph)
+            self.bvh = self.surface.build_bvh()
+        return self.surface, self.bvh
+
+
+class HitBuffer:
+    # highpoly hits of every lowpoly texel
+    def __init__(self, pixels, low_tris, low_bary, hit_tris, hit_bary, heights):
+        self.pixels = pixels
+        self.low_tris = low_tris
+        self.low_bary = low_bary
+        self.hit_tris = hit_tris
+        self.hit_bary = hit_bary
+        # distance of the highpoly above the lowpoly along its normal
+        self.heights = heights
+
+
+def read_array(collection, attribute, size, dtype):
+    data = np.empty(len(collection) * size, dtype=dtype)
+    collection.foreach_get(attribute, data)
+    if size > 1:
+        data.shape = (-1, size)
+    return data
+
+
+def normalize(vectors):
+    lengths = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    lengths[lengths == 0] = 1
+    return vectors / lengths
+
+
+def barycentric(points, a, b, c):
+    v0, v1, v2 = b - a, c - a, points - a
+    d00 = np.sum(v0 * v0, axis=1)
+    d01 = np.sum(v0 * v1, axis=1)
+    d11 = np.sum(v1 * v1, axis=1)
+    d20 = np.sum(v2 * v0, axis=1)
+    d21 = np.sum(v2 * v1, axis=1)
+    denom = d00 * d11 - d01 * d01
+    denom[np.abs(denom) < 1e-20] = 1e-20
+    v = (d11 * d20 - d01 * d21) / denom
+    w = (d00 * d21 - d01 * d20) / denom
+    return np.stack((1 - v - w, v, w), axis=1)
+
+
+def rasterize(surface, width, height, rect=None):
+    # find the lowpoly triangle and barycentric coordinates of every texel
+    # inside rect (x, y, width, height)
+    rx, ry, rw, rh = rect or (0, 0, width, height)
+    tri_uvs = surface.uvs[surface.tri_loops] * (width, height)
+
+    # range of pixel centers covered by each triangle's bounds
+    min_x = np.maximum(np.ceil(tri_uvs[:, :, 0].min(1) - 0.5), rx).astype(np.int64)
+    max_x = np.minimum(np.floor(tri_uvs[:, :, 0].max(1) - 0.5), rx + rw - 1)
+    min_y = np.maximum(np.ceil(tri_uvs[:, :, 1].min(1) - 0.5), ry).astype(np.int64)
+    max_y = np.minimum(np.floor(tri_uvs[:, :, 1].max(1) - 0.5), ry + rh - 1)
+    spans_x = np.maximum(max_x.astype(np.int64) - min_x + 1, 0)
+    spans_y = np.maximum(max_y.astype(np.int64) - min_y + 1, 0)
+    counts = spans_x * spans_y
+
+    tris = np.nonzero(counts)[0]
+    ends = np.cumsum(counts[tris])
+    results = []
+    start = 0
+    while start < len(tris):
+        # limit the number of candidate pixels held in memory
+        first = ends[start] - counts[tris[start]]
+        stop = np.searchsorted(ends, first + BATCH_SIZE, side="right")
+        stop = max(stop, start + 1)
+        batch = tris[start:stop]
+        results.append(
+            rasterize_batch(tri_uvs, batch, counts, spans_x, min_x, min_y, width)
+        )
+        start = stop
+
+    if not results:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty((0, 3), dtype=np.float32)
+
+    pixels = np.concatenate([r[0] for r in results])
+    low_tris = np.concatenate([r[1] for r in results])
+    bary = np.concatenate([r[2] for r in results])
+
+    # pixels on shared edges belong to the first triangle
+    pixels, first = np.unique(pixels, return_index=True)
+    return pixels, low_tris[first], bary[first]
+
+
+def rasterize_batch(tri_uvs, tris, counts, spans_x, min_x, min_y, width):
+    batch_counts = counts[tris]
+    candidate_tris = np.repeat(tris, batch_counts)
+    offsets = np.arange(batch_counts.sum()) - np.repeat(
+        np.cumsum(batch_counts) - batch_counts, batch_counts
+    )
+    px = min_x[candidate_tris] + offsets % spans_x[candidate_tris]
+    py = min_y[candidate_tris] + offsets // spans_x[candidate_tris]
+
+    centers = np.stack((px + 0.5, py + 0.5), axis=1)
+    corners = tri_uvs[candidate_tris]
+    bary = barycentric(centers, corners[:, 0], corners[:, 1], corners[:, 2])
+    inside = np.all(bary >= -1e-6, axis=1)
+
+    pixels = py[inside] * width + px[inside]
+    return pixels, candidate_tris[inside], bary[inside].astype(np.float32)
+
+
+def trace(lowpoly, highpoly, bvh, pixels, low_tris, low_bary, extrusion, max_dist):
+    # cast one ray per texel from the cage towards the lowpoly
+    positions = lowpoly.interpolate(lowpoly.co, low_tris, low_bary, per_vertex=True)
+    normals = normalize(lowpoly.interpolate(lowpoly.normals, low_tris, low_bary))
+    if np.ndim(extrusion) > 0 and len(extrusion) != len(lowpoly.co):
+        # the evaluated mesh has different vertices, use the largest extrusion
+        extrusion = float(np.max(extrusion))
+    if np.ndim(extrusion) > 0:
+        # extrusion per lowpoly vertex
+        extrusion = lowpoly.interpolate(extrusion, low_tris, low_bary, True)[:, None]
+    origins = positions + normals * extrusion
+    if max_dist <= 0:
+        max_dist = sys.float_info.max
+
+    count = len(pixels)
+    hit_tris = np.full(count, -1, dtype=np.int64)
+    locations = np.zeros((count, 3), dtype=np.float32)
+    ray_cast = bvh.ray_cast
+    find_nearest = bvh.find_nearest
+    for start in range(0, count, RAY_CHUNK):
+        end = min(start + RAY_CHUNK, count)
+        rays = zip(
+            origins[start:end].tolist(),
+            (-normals[start:end]).tolist(),
+            positions[start:end].tolist(),
+        )
+        for i, (origin, direction, position) in enumerate(rays, start):
+            location, _, index, _ = ray_cast(origin, direction, max_dist)
+            if index is None:
+                # nothing was hit, use the closest point instead
+                location, _, index, _ = find_nearest(position, max_dist)
+                if index is None:
+                    continue
+            hit_tris[i] = index
+            locations[i] = location
+
+    hit = hit_tris >= 0
+    hit_bary = np.zeros((count, 3), dtype=np.float32)
+    corners = highpoly.co[highpoly.tri_verts[hit_tris[hit]]]
+    hit_bary[hit] = barycentric(
+        locations[hit], corners[:, 0], corners[:, 1], corners[:, 2]
+    )
+    heights = np.sum((locations - positions) * normals, axis=1)
+    return HitBuffer(
+        pixels[hit],
+        low_tris[hit],
+        low_bary[hit],
+        hit_tris[hit],
+        hit_bary[hit],
+        heights[hit],
+    )
+
+
+def self_hits(pixels, low_tris, low_bary):
+    # every texel "hits" the lowpoly itself, used when nothing is transferred
+    return HitBuffer(
+        pixels,
+        low_tris,
+        low_bary,
+        low_tris,
+        low_bary,
+        np.zeros(len(pixels), dtype=np.float32),
+    )
+
+
+# map derivation
+
+
+def derive_normal(hits, lowpoly, highpoly):
+    # highpoly normal in the lowpoly's tangent space
+    hit_normals = normalize(
+        highpoly.interpolate(highpoly.normals, hits.hit_tris, hits.hit_bary)
+    )
+    normals = normalize(
+        lowpoly.interpolate(lowpoly.normals, hits.low_tris, hits.low_bary)
+    )
+    tangents = lowpoly.interpolate(lowpoly.tangents, hits.low_tris, hits.low_bary)
+    tangents = normalize(tangents - normals * np.sum(tangents * normals, 1)[:, None])
+    signs = lowpoly.signs[lowpoly.tri_loops[hits.low_tris, 0]]
+    bitangents = np.cross(normals, tangents) * signs[:, None]
+
+    colors = np.ones((len(hits.pixels), 4), dtype=np.float32)
+    colors[:, 0] = np.sum(hit_normals * tangents, 1) * 0.5 + 0.5
+    colors[:, 1] = np.sum(hit_normals * bitangents, 1) * 0.5 + 0.5
+    colors[:, 2] = np.sum(hit_normals * normals, 1) * 0.5 + 0.5
+    return colors
+
+
+def derive_diffuse(hits, highpoly, material_obj):
+    # base color of the highpoly's materials at the hit points
+    colors = sample_material_input(hits, highpoly, material_obj, "Base Color")
+    colors[:, :3] = linear_to_srgb(colors[:, :3])
+    colors[:, 3] = 1
+    return colors
+
+
+def derive_value(hits, highpoly, material_obj, name):
+    # grayscale map of a principled bsdf input like roughness or metallic
+    values = sample_material_input(hits, highpoly, material_obj, name)
+    return gray(values[:, 0])
+
+
+def derive_curvature(hits, highpoly):
+    # convex edges are bright and concave edges are dark
+    if highpoly.curvature is None:
+        highpoly.curvature = calc_vertex_curvature(highpoly)
+    curvature = highpoly.curvature
+    values = highpoly.interpolate(curvature, hits.hit_tris, hits.hit_bary, True)
+    scale = np.percentile(np.abs(curvature), 99) if len(curvature) else 0
+    if scale > 0:
+        values = values / scale
+    return gray(np.clip(values * 0.5 + 0.5, 0, 1))
+
+
+def derive_height(hits, scale=None):
+    # mid gray is the lowpoly surface
+    heights = hits.heights
+    if scale is None:
+        scale = np.abs(heights).max() if len(heights) else 0
+    if scale > 0:
+        heights = heights / scale
+    return gray(heights * 0.5 + 0.5)
+
+
+def derive_id(hits, highpoly):
+    # flat color per material
+    materials = highpoly.tri_materials[hits.hit_tris]
+    colors = np.ones((len(hits.pixels), 4), dtype=np.float32)
+    for index in np.unique(materials):
+        colors[materials == index, :3] = get_id_color(index)
+    return colors
+
+
+def get_id_color(index):
+    # spread hues with the golden ratio so neighboring ids look different
+    return colorsys.hsv_to_rgb((index * 0.618034) % 1, 0.75, 0.9)
+
+
+def gray(values):
+    colors = np.ones((len(values), 4), dtype=np.float32)
+    colors[:, :3] = values[:, None]
+    return colors
+
+
+def calc_vertex_curvature(surface):
+    # mean change of the normal along the edges of every vertex
+    vertex_count = len(surface.co)
+    vertex_normals = np.zeros((vertex_count, 3), dtype=np.float32)
+    np.add.at(
+        vertex_normals,
+        surface.tri_verts.ravel(),
+        surface.normals[surface.tri_loops.ravel()],
+    )
+    vertex_normals = normalize(vertex_normals)
+
+    edges = np.concatenate(
+        (
+            surface.tri_verts[:, [0, 1]],
+            surface.tri_verts[:, [1, 2]],
+            surface.tri_verts[:, [2, 0]],
+        )
+    )
+    a, b = edges[:, 0], edges[:, 1]
+    delta = surface.co[b] - surface.co[a]
+    lengths = np.sum(delta * delta, axis=1)
+    lengths[lengths == 0] = 1
+    edge_curvature = (
+        np.sum((vertex_normals[b] - vertex_normals[a]) * delta, 1) / lengths
+    )
+
+    curvature = np.zeros(vertex_count, dtype=np.float32)
+    counts = np.zeros(vertex_count, dtype=np.float32)
+    np.add.at(curvature, a, edge_curvature)
+    np.add.at(curvature, b, edge_curvature)
+    np.add.at(counts, a, 1)
+    np.add.at(counts, b, 1)
+    counts[counts == 0] = 1
+    return curvature / counts
+
+
+def sample_material_input(hits, highpoly, material_obj, name):
+    # values of a principled bsdf input at the hit points
+    values = np.ones((len(hits.pixels), 4), dtype=np.float32)
+    materials = highpoly.tri_materials[hits.hit_tris]
+    slots = material_obj.material_slots
+    for index in np.unique(materials):
+        mask = materials == index
+        material = slots[index].material if index < len(slots) else None
+        source = get_input_source(material, name)
+        if isinstance(source, bpy.types.Image) and highpoly.uvs is not None:
+            uvs = highpoly.interpolate(
+                highpoly.uvs, hits.hit_tris[mask], hits.hit_bary[mask]
+            )
+            texels = sample_image(source, uvs)
+            if not source.is_float and not is_non_color(source):
+                # byte images store srgb values
+                texels[:, :3] = srgb_to_linear(texels[:, :3])
+            values[mask] = texels
+        elif isinstance(source, bpy.types.Image):
+            values[mask] = image_mean(source)
+        elif isinstance(source, float):
+            values[mask] = source
+        else:
+            values[mask, : len(source)] = source[:4]
+    return values
+
+
+def get_input_source(material, name):
+    # image or value plugged into an input of the material's principled bsdf
+    if material is not None and material.use_nodes:
+        for node in material.node_tree.nodes:
+            if node.type == "BSDF_PRINCIPLED":
+                socket = node.inputs[name]
+                if socket.is_linked:
+                    from_node = socket.links[0].from_node
+                    if from_node.type == "TEX_IMAGE" and from_node.image is not None:
+                        return from_node.image
+                value = socket.default_value
+                return value if isinstance(value, float) else tuple(value)
+    # fall back to the viewport display settings
+    if name == "Base Color":
+        return tuple(material.diffuse_color) if material else (0.8, 0.8, 0.8, 1.0)
+    if name == "Roughness":
+        return material.roughness if material else 0.5
+    if name == "Metallic":
+        return material.metallic if material else 0.0
+    return 0.0
+
+
+def is_non_color(image):
+    return image.colorspace_settings.name in {"Non-Color", "Raw", "Linear"}
+
+
+def get_image_pixels(image):
+    width, height = image.size
+    pixels = np.empty(width * height * 4, dtype=np.float32)
+    image.pixels.foreach_get(pixels)
+    return pixels.reshape(height, width, 4)
+
+
+def sample_image(image, uvs):
+    # bilinear lookup with repeat wrapping
+    pixels = get_source_pixels(image)
+    height, width = pixels.shape[:2]
+    x = uvs[:, 0] * width - 0.5
+    y = uvs[:, 1] * height - 0.5
+    x0 = np.floor(x).astype(np.int64)
+    y0 = np.floor(y).astype(np.int64)
+    fx = (x - x0)[:, None]
+    fy = (y - y0)[:, None]
+    x0, x1 = x0 % width, (x0 + 1) % width
+    y0, y1 = y0 % height, (y0 + 1) % height
+    top = pixels[y0, x0] * (1 - fx) + pixels[y0, x1] * fx
+    bottom = pixels[y1, x0] * (1 - fx) + pixels[y1, x1] * fx
+    return top * (1 - fy) + bottom * fy
+
+
+def get_source_pixels(image):
+    if image.name_full not in source_pixels:
+        source_pixels[image.name_full] = get_image_pixels(image)
+    return source_pixels[image.name_full]
+
+
+def image_mean(image):
+    return get_source_pixels(image).reshape(-1, 4).mean(axis=0)
+
+
+def srgb_to_linear(values):
+    values = np.clip(values, 0, 1)
+    return np.where(
+        values <= 0.04045,
+        values / 12.92,
+        np.power((values + 0.055) / 1.055, 2.4),
+    )
+
+
+def linear_to_srgb(values):
+    values = np.clip(values, 0, 1)
+    return np.where(
+        values <= 0.0031308,
+        values * 12.92,
+        1.055 * np.power(values, 1 / 2.4) - 0.055,
+    )
+
+
+def dilate(buffer, mask, margin):
+    # extend baked pixels into empty pixels like the cycles bake margin
+    for _ in range(margin):
+        grown = mask.copy()
+        for axis, shift in ((0, 1), (0, -1), (1, 1), (1, -1)):
+            shifted_mask = np.roll(mask, shift, axis=axis)
+            fill = shifted_mask & ~grown
+            buffer[fill] = np.roll(buffer, shift, axis=axis)[fill]
+            grown |= fill
+        if grown.all():
+            break
+        mask = grown
+
+
+def bake_maps(
+    highpoly_obj, lowpoly_obj, images, extrusion, max_dist, transfer=True, high=None
+):
+    # images is a dict of bake type and image, every image gets the same size
+    # without transfer the maps are made from the lowpoly itself
+    # high is the HighpolySurface of the highpoly, made here if not given
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    lowpoly = Surface(lowpoly_obj, depsgraph, use_tangents=True)
+    if lowpoly.uvs is None:
+        return
+
+    width, height = next(iter(images.values())).size
+    pixels, low_tris, low_bary = rasterize(lowpoly, width, height)
+    if transfer:
+        if high is None:
+            high = HighpolySurface(highpoly_obj)
+        highpoly, bvh = high.get()
+        hits = trace(
+            lowpoly, highpoly, bvh, pixels, low_tris, low_bary, extrusion, max_dist
+        )
+    else:
+        highpoly = lowpoly
+        hits = self_hits(pixels, low_tris, low_bary)
+
+    margin = bpy.context.scene.render.bake.margin
+    try:
+        for bake_type, image in images.items():
+            colors = derive(bake_type, hits, lowpoly, highpoly, highpoly_obj)
+            write_pixels(image, hits.pixels, colors, margin)
+    finally:
+        source_pixels.clear()
+
+
+def bake_maps_tiled(
+    highpoly_obj,
+    lowpoly_obj,
+    paths,
+    size,
+    tile_size,
+    extrusion,
+    max_dist,
+    transfer,
+    compression=6,
+    bit_depths=None,
+    high=None,
+):
+    # bake bands of rows and stream each finished band to a png
+    # paths is a dict of bake type and file path
+    # heights are scaled by the largest extrusion instead of the largest height,
+    # which is only known once every band is traced
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    lowpoly = Surface(lowpoly_obj, depsgraph, use_tangents=True)
+    if lowpoly.uvs is None:
+        return False
+
+    if transfer:
+        if high is None:
+            high = HighpolySurface(highpoly_obj)
+        highpoly, bvh = high.get()
+    else:
+        highpoly = lowpoly
+
+    margin = bpy.context.scene.render.bake.margin
+    tile_size = max(1, min(tile_size, MAX_BAND_PIXELS // size))
+    # heights must use the same scale in every band
+    height_scale = float(np.max(extrusion)) if np.max(extrusion) > 0 else None
+
+    writers = {
+        bake_type: PNGStreamWriter(
+            path,
+            size,
+            size,
+            bit_depth=(bit_depths or {}).get(bake_type, 8),
+            compression=compression,
+        )
+        for bake_type, path in paths.items()
+    }
+    try:
+        # png rows go from top to bottom
+        top = size
+        while top > 0:
+            bottom = max(0, top - tile_size)
+            # extra rows so the margin continues across bands
+            y0 = max(0, bottom - margin)
+            y1 = min(size, top + margin)
+            rect = (0, y0, size, y1 - y0)
+            pixels, low_tris, low_bary = rasterize(lowpoly, size, size, rect)
+            if transfer:
+                hits = trace(
+                    lowpoly,
+                    highpoly,
+                    bvh,
+                    pixels,
+                    low_tris,
+                    low_bary,
+                    extrusion,
+                    max_dist,
+                )
+            else:
+                hits = self_hits(pixels, low_tris, low_bary)
+
+            band_pixels = hits.pixels - y0 * size
+            for bake_type, writer in writers.items():
+                colors = derive(
+                    bake_type, hits, lowpoly, highpoly, highpoly_obj, height_scale
+                )
+                buffer = np.zeros((y1 - y0, size, 4), dtype=np.float32)
+                buffer[:, :, 3] = 1
+                mask = np.zeros((y1 - y0, size), dtype=bool)
+                buffer.reshape(-1, 4)[band_pixels] = colors
+                mask.reshape(-1)[band_pixels] = True
+                dilate(buffer, mask, margin)
+                writer.write_rows(buffer[bottom - y0 : top - y0][::-1])
+            top = bottom
+    finally:
+        for writer in writers.values():
+            writer.close()
+        source_pixels.clear()
+
+    return True
+
+
+def derive(bake_type, hits, lowpoly, highpoly, material_obj, height_scale=None):
+    if bake_type == "NORMAL":
+        return derive_normal(hits, lowpoly, highpoly)
+    if bake_type == "DIFFUSE":
+        return derive_diffuse(hits, highpoly, material_obj)
+    if bake_type == "ROUGHNESS":
+        return derive_value(hits, highpoly, material_obj, "Roughness")
+    if bake_type == "METALLIC":
+        return derive_value(hits, highpoly, material_obj, "Metallic")
+    if bake_type == "CURVATURE":
+        return derive_curvature(hits, highpoly)
+    if bake_type == "HEIGHT":
+        return derive_height(hits, height_scale)
+    if bake_type == "ID":
+        return derive_id(hits, highpoly)
+    raise ValueError("Unknown bake type " + bake_type)
+
+
+def write_pixels(image, pixels, colors, margin):
+    width, height = image.size
+    buffer = get_image_pixels(image).reshape(-1, 4)
+    buffer[pixels] = colors
+    mask = np.zeros(width * height, dtype=bool)
+    mask[pixels] = True
+    buffer = buffer.reshape(height, width, 4)
+    dilate(buffer, mask.reshape(height, width), margin)
+
+    image.pixels.foreach_set(buffer.ravel())
+    image.update()
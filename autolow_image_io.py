@@ -0,0 +1,155 @@
+import numpy as np
+import os
+import struct
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import OpenImageIO as oiio
+except ImportError:
+    oiio = None
+
+
+# image writing without going through blender images
+
+
+class PNGStreamWriter:
+    # writes a png row band by row band, so the whole image is never in memory
+    def __init__(self, path, width, height, bit_depth=8, compression=6):
+        self.width = width
+        self.height = height
+        self.bit_depth = bit_depth
+        self.rows_written = 0
+        self.compressor = zlib.compressobj(compression)
+        self.file = open(path, "wb")
+        self.file.write(b"\x89PNG\r\n\x1a\n")
+        # rgba, no interlacing
+        header = struct.pack(">IIBBBBB", width, height, bit_depth, 6, 0, 0, 0)
+        self.write_chunk(b"IHDR", header)
+
+    def write_chunk(self, chunk_type, data):
+        self.file.write(struct.pack(">I", len(data)))
+        self.file.write(chunk_type)
+        self.file.write(data)
+        crc = zlib.crc32(data, zlib.crc32(chunk_type))
+        self.file.write(struct.pack(">I", crc & 0xFFFFFFFF))
+
+    def write_rows(self, rows):
+        # rows are float rgba values from 0 to 1, ordered from top to bottom
+        rows = to_integers(rows, self.bit_depth)
+        # every row starts with filter type 0
+        filters = np.zeros((len(rows), 1), dtype=np.uint8)
+        data = np.concatenate((filters, rows.reshape(len(rows), -1).view(np.uint8)), 1)
+        compressed = self.compressor.compress(data.tobytes())
+        if compressed:
+            self.write_chunk(b"IDAT", compressed)
+        self.rows_written += len(rows)
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.write_chunk(b"IDAT", self.compressor.flush())
+        self.write_chunk(b"IEND", b"")
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def to_integers(values, bit_depth):
+    maximum = (1 << bit_depth) - 1
+    values = np.clip(values, 0, 1) * maximum + 0.5
+    if bit_depth == 16:
+        # png stores 16 bit values big endian
+        return values.astype(">u2")
+    return values.astype(np.uint8)
+
+
+def write_png(path, pixels, bit_depth=8, compression=6):
+    # pixels are float rgba rows from bottom to top, like blender images
+    height, width = pixels.shape[:2]
+    with PNGStreamWriter(path, width, height, bit_depth, compression) as writer:
+        writer.write_rows(pixels[::-1])
+
+
+def write_exr(path, pixels):
+    height, width = pixels.shape[:2]
+    output = oiio.ImageOutput.create("exr")
+    spec = oiio.ImageSpec(width, height, 4, "float")
+    spec.attribute("compression", "zip")
+    output.open(path, spec)
+    output.write_image(pixels[::-1])
+    output.close()
+
+
+def can_write(file_format):
+    return file_format == "PNG" or (file_format == "OPEN_EXR" and oiio is not None)
+
+
+class ImageWriter:
+    # encodes and writes images on threads while the next bake runs
+    # zlib releases the gil, so png compression runs in parallel
+    def __init__(self, threads=None, max_pending=2):
+        self.pool = ThreadPoolExecutor(max_workers=threads or min(4, os.cpu_count()))
+        # every pending image holds a copy of its pixels, so only a few can wait
+        self.pending = threading.Semaphore(max_pending)
+        self.jobs = []
+
+    def submit(
+        self, path, pixels, file_format="PNG", bit_depth=8, compression=6, done=None
+    ):
+        # done is called on the main thread by flush once the file is written
+        self.pending.acquire()
+        future = self.pool.submit(
+            self.write, path, pixels, file_format, bit_depth, compression
+        )
+        self.jobs.append((path, future, done))
+        return future
+
+    def write(self, path, pixels, file_format, bit_depth, compression):
+        # the file only appears once it's complete, so a crash never leaves
+        # half an image at the path
+        temp = path + ".tmp"
+        try:
+            if file_format == "OPEN_EXR":
+                write_exr(temp, pixels)
+            else:
+                write_png(temp, pixels, bit_depth, compression)
+            os.replace(temp, path)
+        finally:
+            self.pending.release()
+
+    def flush(self):
+        # wait for every image and return the errors
+        errors = []
+        for path, future, done in self.jobs:
+            try:
+                future.result()
+            except Exception as error:
+                errors.append(path + ": " + str(error))
+                continue
+            if done is not None:
+                done()
+        self.jobs.clear()
+        return errors
+
+
+writer = None
+
+
+def get_writer():
+    global writer
+    if writer is None:
+        writer = ImageWriter()
+    return writer
+
+
+def flush():
+    # wait for all images of the run to be written
+    if writer is None:
+        return []
+    return writer.flush()
@@ -0,0 +1,142 @@
+import bpy
+import json
+import os
+import pathlib
+from . import autolow_cache as cache
+
+
+# journal of a run next to the blend file, so a run that crashed can be
+# started again without repeating finished objects and stages
+#
+# every queued object has an item with the stages it finished, the name of its
+# lowpoly and the files of its saved maps
+
+JOURNAL_VERSION = 1
+
+# a journal of a run with other settings is not resumed
+FIELDS = (
+    cache.REMESH_FIELDS
+    + cache.BAKE_FIELDS
+    + (
+        "unwrap_method",
+        "seam_angle",
+        "uv_padding",
+        "lod_count",
+        "lod_ratio",
+    )
+)
+
+path = None
+state = {}
+
+
+def begin():
+    # load the journal of the last run, or start a new one
+    global path, state
+    path = None
+    state = {}
+    if bpy.data.filepath == "":
+        # nowhere to write the journal
+        return
+
+    path = pathlib.Path(bpy.data.filepath + ".autolow_journal.json")
+    key = cache.make_key("journal", fields=FIELDS)
+    if path.is_file():
+        try:
+            with open(path) as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            state = {}
+        if state.get("version") != JOURNAL_VERSION or state.get("key") != key:
+            state = {}
+        elif state.get("items"):
+            print("AutoLow: resuming the run from " + str(path))
+
+    if not state:
+        state = {"version": JOURNAL_VERSION, "key": key, "items": {}}
+        write()
+
+
+def end():
+    # the run finished, nothing is left to resume
+    global path
+    if path is not None and path.is_file():
+        path.unlink()
+    path = None
+
+
+def is_active():
+    return path is not None
+
+
+def write():
+    if path is None:
+        return
+    # replace the file at once so a crash never leaves half a journal
+    temp = path.with_suffix(".tmp")
+    with open(temp, "w") as file:
+        json.dump(state, file, indent=2)
+    os.replace(temp, path)
+
+
+def get_item(name):
+    if path is None:
+        return {"stages": [], "lowpolys": [], "maps": {}}
+    return state["items"].setdefault(name, {"stages": [], "lowpolys": [], "maps": {}})
+
+
+def mark_stage(name, stage, lowpoly=None):
+    if path is None:
+        return
+    item = get_item(name)
+    if stage not in item["stages"]:
+        item["stages"].append(stage)
+    if lowpoly is not None:
+        item["lowpolys"] = [lowpoly.name]
+    write()
+
+
+def mark_map(name, bake_type, filepath, mesh_hash):
+    # the hash of the lowpoly with its uvs, the map only fits that lowpoly
+    if path is None:
+        return
+    get_item(name)["maps"][bake_type] = [bpy.path.abspath(filepath), mesh_hash]
+    write()
+
+
+def mark_done(name, lowpolys):
+    if path is None:
+        return
+    item = get_item(name)
+    item["lowpolys"] = [lowpoly.name for lowpoly in lowpolys]
+    mark_stage(name, "done")
+
+
+def get_lowpoly(name, stage):
+    # the lowpoly of an object that finished the stage, if it's in the file
+    item = get_item(name)
+    if stage not in item["stages"] or not item.get("lowpolys"):
+        return None
+    lowpoly = bpy.data.objects.get(item["lowpolys"][0])
+    if lowpoly is None or lowpoly.type != "MESH" or len(lowpoly.data.polygons) == 0:
+        return None
+    return lowpoly
+
+
+def get_lowpolys(name):
+    # all lowpolys of a finished object, if they are all in the file
+    item = get_item(name)
+    if "done" not in item["stages"]:
+        return None
+    lowpolys = [bpy.data.objects.get(n) for n in item.get("lowpolys", [])]
+    if not lowpolys or None in lowpolys:
+        return None
+    return lowpolys
+
+
+def get_map(name, bake_type, mesh_hash):
+    # file of a map that was saved for the same lowpoly
+    saved = get_item(name)["maps"].get(bake_type)
+    if saved is None or saved[1] != mesh_hash or not os.path.isfile(saved[0]):
+        return None
+    return saved[0]
@@ -1,45 +1,120 @@
 from .autolow_utils import *
+from . import autolow_cache as cache
+from . import autolow_stats as stats
+from . import autolow_hitbuffer as hitbuffer
+from . import autolow_journal as journal
+from collections import namedtuple
+from functools import partial
+import math
+
+
+# is_cycles: the map can be baked with cycles
+# is_traced: the map can be derived from the hit buffer
+BakeMap = namedtuple(
+    "BakeMap", ("bake_type", "name", "non_color", "prop", "is_cycles", "is_traced")
+)
+
+BAKE_MAPS = (
+    BakeMap("NORMAL", "normal", True, "is_normal_bake_on", True, True),
+    BakeMap("DIFFUSE", "diffuse", False, "is_diffuse_bake_on", True, True),
+    BakeMap("AO", "ao", True, "is_ao_bake_on", True, False),
+    BakeMap("ROUGHNESS", "roughness", True, "is_roughness_bake_on", True, True),
+    BakeMap("METALLIC", "metallic", True, "is_metallic_bake_on", False, True),
+    BakeMap("CURVATURE", "curvature", True, "is_curvature_bake_on", False, True),
+    BakeMap("HEIGHT", "height", True, "is_height_bake_on", False, True),
+    BakeMap("ID", "id", False, "is_id_bake_on", False, True),
+)
+
+
+# topology checks of meshes that were already checked, by geometry hash
+topology_cache = {}
 
 
 # main functions
 
 
-def remesh_process(highpoly, lowpoly):
+def remesh_process(highpoly, lowpoly, high=None):
+    # high is the HighpolySurface of the highpoly, made here if not given
     props = get_props()
     remesher = props.remesher
     remesh_percent = props.remesh_percent
 
-    if remesher == "VOXEL":
+    if high is None:
+        high = hitbuffer.HighpolySurface(highpoly)
+
+    key = None
+    if props.use_cache and remesher != "NONE":
+        key = cache.remesh_key(highpoly)
+        with stats.stage("cache_load", lowpoly):
+            cached = cache.load_remesh(key, lowpoly)
+        if cached is not None:
+            return cached
+
+    if remesher != "NONE" and props.remesh_target != "PERCENT":
+        # search the remesh setting that meets the budget
+        with stats.stage("remesh_search", lowpoly) as record:
+            triangles, error = search_remesh(lowpoly, high)
+            record["triangles"] = triangles
+            record["error"] = round(error, 6)
+        print(
+            "AutoLow: remeshed to "
+            + str(triangles)
+            + " triangles with an error of "
+            + format(error, ".4g")
+        )
+
+    elif remesher == "VOXEL":
         # voxel remesh
-        avg_voxel_size = calc_avg_voxel_size(lowpoly)
-        lowpoly.data.remesh_voxel_size = avg_voxel_size * (100 / remesh_percent)
-        bpy.ops.object.voxel_remesh()
+        with stats.stage("voxel_size", lowpoly):
+            avg_voxel_size = calc_avg_voxel_size(lowpoly)
+        with stats.stage("voxel_remesh", lowpoly):
+            voxel_remesh(lowpoly, avg_voxel_size * (100 / remesh_percent))
 
     elif remesher == "QUAD":
         # quad remesh
-        lowpoly_mesh = lowpoly.data
-        lowpoly_vertices = lowpoly_mesh.vertices
-        lowpoly_facecount = len(lowpoly_mesh.polygons)
+        lowpoly_facecount = len(lowpoly.data.polygons)
         lowpoly_target_faces = int(lowpoly_facecount * (remesh_percent / 100))
-        vertex_count = len(lowpoly_vertices)
 
-        bpy.ops.object.quadriflow_remesh(target_faces=lowpoly_target_faces)
+        # quadriflow fails on meshes that aren't manifold, check first
+        with stats.stage("quadriflow_check", lowpoly):
+            path = choose_quad_path(lowpoly.data)
 
-        # if the vertex count is the same after remeshing, the remesh probably failed
-        # it's likely that the reason is that the mesh isn't manifold
-        if len(lowpoly_vertices) == vertex_count:
-            # voxel remesh to make mesh manifold
-            lowpoly.data.remesh_voxel_size = calc_avg_voxel_size(lowpoly)
-            bpy.ops.object.voxel_remesh()
-            bpy.ops.object.quadriflow_remesh(target_faces=lowpoly_target_faces)
+        if path == "DECIMATE":
+            print("AutoLow: " + highpoly.name + " is open, decimating instead")
+            decimate = lowpoly.modifiers.new("Autolow_Decimate", "DECIMATE")
+            decimate.ratio = remesh_percent / 100
+            with stats.stage("decimate", lowpoly):
+                apply_modifiers(lowpoly)
+        else:
+            if path == "VOXEL_QUAD":
+                # voxel remesh to make mesh manifold
+                with stats.stage("voxel_remesh", lowpoly):
+                    voxel_remesh(lowpoly, calc_avg_voxel_size(lowpoly))
+
+            vertex_count = len(lowpoly.data.vertices)
+            with stats.stage("quadriflow", lowpoly):
+                quadriflow_remesh(lowpoly, lowpoly_target_faces)
+
+            # if the vertex count is the same after remeshing, the remesh failed
+            # for a reason the check didn't catch
+            if len(lowpoly.data.vertices) == vertex_count:
+                with stats.stage("quadriflow_fallback", lowpoly):
+                    voxel_remesh(lowpoly, calc_avg_voxel_size(lowpoly))
+                    quadriflow_remesh(lowpoly, lowpoly_target_faces)
 
     elif remesher == "DECIMATE":
         # decimate
         decimate = lowpoly.modifiers.new("Autolow_Decimate", "DECIMATE")
         decimate.ratio = remesh_percent / 100
-        bpy.ops.object.modifier_apply(modifier=decimate.name)
+        with stats.stage("decimate", lowpoly):
+            apply_modifiers(lowpoly)
+
+    if remesher != "NONE" and props.detail_method == "PROJECT":
+        # move the vertices onto the high poly, normals are baked with transfer
+        with stats.stage("project", lowpoly):
+            project_to_surface(lowpoly, high)
 
-    if remesher != "NONE":
+    elif remesher != "NONE":
         # add multires and shrinkwrap modifiers for better result
         multires = lowpoly.modifiers.new("AutoLow_Multires", "MULTIRES")
         shrinkwrap = lowpoly.modifiers.new("AutoLow_Shrinkwrap", "SHRINKWRAP")
@@ -47,59 +122,470 @@ def remesh_process(highpoly, lowpoly):
         shrinkwrap.target = highpoly
         shrinkwrap.use_negative_direction = True
 
-        # subdivide multires modifier 3 times
-        for _ in range(3):
-            bpy.ops.object.multires_subdivide(
-                modifier="AutoLow_Multires", mode="CATMULL_CLARK"
-            )
-        bpy.ops.object.modifier_apply(modifier="AutoLow_Shrinkwrap")
+        # multires has no data level api, its operators get an override instead
+        with object_override(lowpoly):
+            # every level has 4 times the faces of the previous one
+            for level in range(props.detail_level):
+                with stats.stage("multires_subdivide_" + str(level + 1), lowpoly):
+                    bpy.ops.object.multires_subdivide(
+                        modifier=multires.name, mode="CATMULL_CLARK"
+                    )
+            with stats.stage("shrinkwrap", lowpoly):
+                bpy.ops.object.modifier_apply(modifier=shrinkwrap.name)
         multires.levels = 0
 
+    if key is not None:
+        with stats.stage("cache_store", lowpoly):
+            cache.store_remesh(key, lowpoly)
+
+    return lowpoly
+
+
+def get_topology(mesh):
+    key = cache.hash_mesh(mesh)
+    if key not in topology_cache:
+        topology_cache[key] = check_topology(mesh)
+    return topology_cache[key]
+
+
+def choose_quad_path(mesh):
+    # pick the remesh that works for the mesh before running quadriflow
+    topology = get_topology(mesh)
+    problems = (
+        topology["boundary_edges"]
+        + topology["non_manifold_edges"]
+        + topology["flipped_edges"]
+        + topology["loose_edges"]
+        + topology["loose_verts"]
+    )
+    if problems == 0:
+        return "QUAD"
+    # voxels turn open surfaces into thin shells, those are decimated instead
+    if topology["boundary_edges"] > topology["edges"] * 0.05:
+        return "DECIMATE"
+    return "VOXEL_QUAD"
+
+
+def voxel_remesh(lowpoly, voxel_size):
+    add_voxel_remesh(lowpoly, voxel_size)
+    apply_modifiers(lowpoly)
+
+
+def add_voxel_remesh(lowpoly, voxel_size):
+    # the remesh modifier gives the same result as the operator
+    remesh = lowpoly.modifiers.new("Autolow_Remesh", "REMESH")
+    remesh.mode = "VOXEL"
+    remesh.voxel_size = voxel_size
+    remesh.adaptivity = lowpoly.data.remesh_voxel_adaptivity
+    remesh.use_smooth_shade = True
+    return remesh
+
+
+def quadriflow_remesh(lowpoly, target_faces):
+    with object_override(lowpoly):
+        bpy.ops.object.quadriflow_remesh(target_faces=target_faces)
+
+
+def search_remesh(lowpoly, high):
+    # find the remesh setting for a triangle budget or an error tolerance with a
+    # few trial remeshes, apply it and return the triangles and error
+    props = get_props()
+    remesher = props.remesher
+    is_error = props.remesh_target == "ERROR"
+    target = props.target_error if is_error else props.target_triangles
+
+    high, high_bvh = high.get()
+    triangles_in = len(high.tri_verts)
+
+    if remesher == "QUAD":
+        path = choose_quad_path(lowpoly.data)
+        if path == "DECIMATE":
+            remesher = "DECIMATE"
+        elif path == "VOXEL_QUAD":
+            voxel_remesh(lowpoly, calc_avg_voxel_size(lowpoly))
+
+    # the density is searched, more density always means more triangles
+    if remesher == "VOXEL":
+        trial = ModifierTrial(lowpoly, remesher)
+        # triangles grow with the square of the voxel density
+        exponent = 2
+        limits = (1e-3, 2.0)
+        if is_error:
+            # voxels are off the surface by about half their size
+            scale = float(np.mean(lowpoly.matrix_world.to_scale()))
+            guess = trial.voxel_size * scale / (2 * target)
+        else:
+            guess = math.sqrt(target / triangles_in)
+    else:
+        if remesher == "DECIMATE":
+            trial = ModifierTrial(lowpoly, remesher)
+        else:
+            trial = QuadTrial(lowpoly, triangles_in)
+        # the density is the ratio of triangles kept
+        exponent = 1
+        limits = (1e-4, 1.0)
+        guess = 0.1 if is_error else target / triangles_in
+
+    def clamp(density):
+        return min(max(density, limits[0]), limits[1])
+
+    def measure(density):
+        trial.set(density)
+        low = hitbuffer.Surface(lowpoly, bpy.context.evaluated_depsgraph_get())
+        error = calc_surface_error(low, high, high_bvh) if is_error else None
+        return len(low.tri_verts), error
+
+    results = {}
+    density = clamp(guess)
+    previous = None
+    failing = None
+    passing = None
+    for _ in range(props.max_trials):
+        triangles, error = measure(density)
+        results[density] = (triangles, error)
+
+        if is_error:
+            # bisect between the densest failing and sparsest passing trial
+            if error <= target:
+                passing = density if passing is None else min(passing, density)
+            else:
+                failing = density if failing is None else max(failing, density)
+            if passing is None:
+                next_density = clamp(density * 2)
+            elif failing is None:
+                next_density = clamp(density / 2)
+            elif passing / failing < 1.05:
+                break
+            else:
+                next_density = math.sqrt(passing * failing)
+        else:
+            if abs(triangles - target) <= target * 0.05:
+                break
+            # growth measured from the last two trials, or the expected one
+            slope = exponent
+            if previous is not None and triangles > 0 and previous[1] > 0:
+                measured = math.log(triangles / previous[1]) / math.log(
+                    density / previous[0]
+                )
+                if 0.25 < measured < 4:
+                    slope = measured
+            previous = (density, triangles)
+            ratio = target / max(triangles, 1)
+            next_density = clamp(density * ratio ** (1 / slope))
+
+        if next_density in results:
+            break
+        density = next_density
+
+    if is_error:
+        # fewest triangles within the tolerance, otherwise the smallest error
+        within = [d for d in results if results[d][1] <= target]
+        if within:
+            best = min(within, key=lambda d: results[d][0])
+        else:
+            best = min(results, key=lambda d: results[d][1])
+    else:
+        # most triangles within the budget, otherwise the fewest
+        within = [d for d in results if results[d][0] <= target]
+        if within:
+            best = max(within, key=lambda d: results[d][0])
+        else:
+            best = min(results, key=lambda d: results[d][0])
+
+    trial.apply(best)
+    triangles, error = results[best]
+    if error is None:
+        low = hitbuffer.Surface(lowpoly, bpy.context.evaluated_depsgraph_get())
+        error = calc_surface_error(low, high, high_bvh)
+    return triangles, error
+
+
+class ModifierTrial:
+    # trials only change a modifier setting, the modifier is applied at the end
+    def __init__(self, lowpoly, remesher):
+        self.lowpoly = lowpoly
+        if remesher == "VOXEL":
+            self.voxel_size = calc_avg_voxel_size(lowpoly)
+            self.modifier = add_voxel_remesh(lowpoly, self.voxel_size)
+        else:
+            self.modifier = lowpoly.modifiers.new("Autolow_Decimate", "DECIMATE")
+
+    def set(self, density):
+        if self.modifier.type == "REMESH":
+            self.modifier.voxel_size = self.voxel_size / density
+        else:
+            self.modifier.ratio = density
+
+    def apply(self, density):
+        self.set(density)
+        apply_modifiers(self.lowpoly)
 
-def uv_unwrap_process():
-    method = get_props().unwrap_method
+
+class QuadTrial:
+    # quadriflow has no modifier, every trial remeshes a copy of the mesh
+    def __init__(self, lowpoly, triangles):
+        self.lowpoly = lowpoly
+        self.triangles = triangles
+        self.base = lowpoly.data
+        self.made = [self.base]
+        self.meshes = {}
+
+    def set(self, density):
+        lowpoly = self.lowpoly
+        if density not in self.meshes:
+            target_faces = max(1, int(self.triangles * density / 2))
+            lowpoly.data = self.base.copy()
+            quadriflow_remesh(lowpoly, target_faces)
+
+            if len(lowpoly.data.vertices) == len(self.base.vertices):
+                # same fallback as the percent mode, kept for the next trials
+                voxel_remesh(lowpoly, calc_avg_voxel_size(lowpoly))
+                self.base = lowpoly.data.copy()
+                self.made.append(self.base)
+                quadriflow_remesh(lowpoly, target_faces)
+
+            self.meshes[density] = lowpoly.data
+            self.made.append(lowpoly.data)
+        lowpoly.data = self.meshes[density]
+
+    def apply(self, density):
+        self.set(density)
+        for mesh in self.made:
+            if mesh.users == 0:
+                bpy.data.meshes.remove(mesh)
+        self.lowpoly.data.name = self.lowpoly.name
+
+
+def uv_unwrap_process(lowpoly):
+    props = get_props()
+    method = props.unwrap_method
+    margin = get_uv_margin()
 
     if method == "SMART":
-        bpy.ops.object.editmode_toggle()
-        bpy.ops.mesh.select_all(action="SELECT")
-        bpy.ops.uv.smart_project(island_margin=0.05)
-        bpy.ops.object.editmode_toggle()
+        with stats.stage("smart_project", lowpoly) as record:
+            with edit_mode([lowpoly]):
+                bpy.ops.uv.smart_project(island_margin=margin)
+            record["uv_coverage"] = round(calc_uv_coverage(lowpoly.data), 4)
+
+    elif method == "SEAMS":
+        # seams are marked at the data level, only the unwrap needs edit mode
+        with stats.stage("seam_unwrap", lowpoly) as record:
+            mark_seams(lowpoly.data, props.seam_angle)
+            with edit_mode([lowpoly]):
+                bpy.ops.uv.unwrap(method="CONFORMAL", margin=margin)
+            record["uv_coverage"] = round(calc_uv_coverage(lowpoly.data), 4)
 
+    else:
+        return
 
-def bake_process(highpoly, lowpoly):
+    print(
+        "AutoLow: UVs of "
+        + lowpoly.name
+        + " cover "
+        + format(record["uv_coverage"] * 100, ".1f")
+        + "% of the texture"
+    )
+
+
+def bake_process(highpoly, lowpoly, transfer_normals=False, high=None):
+    run_steps(bake_steps(highpoly, lowpoly, transfer_normals, high))
+
+
+def bake_steps(highpoly, lowpoly, transfer_normals=False, high=None):
+    # the bake as steps, the name of every slow step is yielded before it runs
+    # transfer_normals: the lowpoly has no detail of its own, so the normals
+    # are transferred from the highpoly with any bake method
+    # high: the HighpolySurface of the highpoly, shared with the remesh
     props = get_props()
     method = props.bake_method
     cage_settings = props.cage_settings
     extrusion = props.extrusion
     ray_dist = props.ray_distance
-    is_normal_bake_on = props.is_normal_bake_on
-    is_diffuse_bake_on = props.is_diffuse_bake_on
-
-    if method != "NONE":
-        # make new material
-        material = bpy.data.materials.new(name="Autolow_Material")
-        lowpoly.active_material = material
-        material.use_nodes = True
-        nodes = material.node_tree.nodes
-        links = material.node_tree.links
-        principled = nodes.get("Principled BSDF")
-        principled.select = False
-        output = nodes.get("Material Output")
-        output.select = False
 
+    if method == "NONE":
+        return
+    if high is None:
+        high = hitbuffer.HighpolySurface(highpoly)
+
+    yield "bake_setup"
+    maps = [m for m in BAKE_MAPS if getattr(props, m.prop)]
+
+    # look up cached maps before setting up the bake
+    images = {}
+    keys = {}
+    if props.use_cache:
+        keys = cache.bake_keys(highpoly, lowpoly, [m.name for m in maps])
+        for m in maps:
+            image = cache.load_image(
+                keys[m.name], highpoly.name + "_" + m.name, m.non_color
+            )
+            if image is not None:
+                images[m.bake_type] = image
+
+    # maps saved by a run that didn't finish are loaded like cached maps
+    mesh_hash = None
+    if journal.is_active() and props.is_image_saved:
+        mesh_hash = cache.hash_mesh(lowpoly.data, use_uvs=True)
+        for m in maps:
+            filepath = journal.get_map(highpoly.name, m.bake_type, mesh_hash)
+            if m.bake_type not in images and filepath is not None:
+                image = bpy.data.images.load(filepath)
+                if m.non_color:
+                    image.colorspace_settings.name = "Non-Color"
+                images[m.bake_type] = image
+
+    pending = [m for m in maps if m.bake_type not in images]
+
+    # maps that don't need cycles are derived from the hit buffer
+    # tiled baking can only be done with the hit buffer
+    is_transfer = method == "TRANSFER"
+    is_tiled = props.is_tiled_bake
+    is_hitbuffer_engine = props.bake_engine == "HITBUFFER" and is_transfer
+    # projected detail only exists on the highpoly, so the normals are always
+    # transferred with the hit buffer, also when the other maps are not
+    # multires without levels has no detail to bake either
+    is_projected = transfer_normals or (
+        props.remesher != "NONE"
+        and (props.detail_method == "PROJECT" or props.detail_level == 0)
+    )
+    projected = [
+        m
+        for m in pending
+        if m.bake_type == "NORMAL" and is_projected and not is_transfer
+    ]
+    traced = [
+        m
+        for m in pending
+        if m not in projected
+        and m.is_traced
+        and (is_hitbuffer_engine or is_tiled or not m.is_cycles)
+    ]
+    cycles_maps = [m for m in pending if m not in traced and m not in projected]
+
+    if cage_settings == "AUTO" and (traced or cycles_maps or projected):
+        # the same cage distances are used by cycles and the hit buffer
+        with stats.stage("cage_offsets", lowpoly):
+            cage_offsets = calc_cage_offsets(lowpoly, high)
+        trace_extrusion = cage_offsets
+        trace_ray_dist = 0
+    else:
+        trace_extrusion = extrusion
+        trace_ray_dist = ray_dist
+
+    saved = set()
+    if traced and is_tiled:
+        # tiles are streamed to disk, the images are loaded afterwards
+        # only pngs can be streamed, exr normals are written as 16 bit pngs
+        paths = {}
+        names = {}
+        bit_depths = {}
+        for m in traced:
+            name = get_unique_image_name(highpoly.name + "_" + m.name)
+            names[m.bake_type] = name
+            paths[m.bake_type] = str(pathlib.Path(get_image_dir()) / (name + ".png"))
+            file_format, bit_depth = get_save_format(m)
+            if file_format == "OPEN_EXR":
+                print("AutoLow: tiled " + m.name + " map is saved as a 16 bit PNG")
+                bit_depth = 16
+            elif m.non_color and props.use_16_bit:
+                # the bands are written by autolow, not by background saving
+                bit_depth = 16
+            bit_depths[m.bake_type] = bit_depth
+        yield "bake_tiled"
+        with stats.stage("bake_tiled", lowpoly):
+            is_baked = hitbuffer.bake_maps_tiled(
+                highpoly,
+                lowpoly,
+                paths,
+                int(props.resolution),
+                int(props.tile_size),
+                trace_extrusion,
+                trace_ray_dist,
+                is_transfer,
+                props.png_compression,
+                bit_depths,
+                high,
+            )
+        if is_baked:
+            for m in traced:
+                image = bpy.data.images.load(paths[m.bake_type])
+                # the loaded image is named after the file, the next name check
+                # looks for the name without the extension
+                image.name = names[m.bake_type]
+                if m.non_color:
+                    image.colorspace_settings.name = "Non-Color"
+                images[m.bake_type] = image
+                saved.add(m.bake_type)
+            traced = []
+
+    for m in pending:
+        if m.bake_type not in images:
+            file_format, bit_depth = get_save_format(m)
+            # maps are named after the object, parallel workers bake into the
+            # same folder
+            name = get_unique_image_name(highpoly.name + "_" + m.name)
+            images[m.bake_type] = new_image(
+                name, non_color=m.non_color, use_float=bit_depth > 8
+            )
+
+    # make new material
+    material = bpy.data.materials.new(name="Autolow_Material")
+    lowpoly.active_material = material
+    material.use_nodes = True
+    nodes = material.node_tree.nodes
+    links = material.node_tree.links
+    principled = nodes.get("Principled BSDF")
+    principled.select = False
+    output = nodes.get("Material Output")
+    output.select = False
+
+    textures = {}
+    for index, m in enumerate(maps):
+        textures[m.bake_type] = add_map_nodes(
+            m.bake_type, images[m.bake_type], index, nodes, links, principled
+        )
+
+    if traced:
+        yield "bake_hitbuffer"
+        with stats.stage("bake_hitbuffer", lowpoly):
+            hitbuffer.bake_maps(
+                highpoly,
+                lowpoly,
+                {m.bake_type: images[m.bake_type] for m in traced},
+                trace_extrusion,
+                trace_ray_dist,
+                transfer=is_transfer,
+                high=high,
+            )
+
+    if projected:
+        yield "bake_projected_normal"
+        with stats.stage("bake_projected_normal", lowpoly):
+            hitbuffer.bake_maps(
+                highpoly,
+                lowpoly,
+                {m.bake_type: images[m.bake_type] for m in projected},
+                trace_extrusion,
+                trace_ray_dist,
+                transfer=True,
+                high=high,
+            )
+
+    if cycles_maps:
         # bake settings
         bpy.context.scene.render.engine = "CYCLES"
         bpy.context.scene.render.bake.use_pass_direct = False
         bpy.context.scene.render.bake.use_pass_indirect = False
 
-        if method == "TRANSFER":
+        if is_transfer:
             bpy.context.scene.render.bake.use_selected_to_active = True
         else:
             bpy.context.scene.render.bake.use_selected_to_active = False
 
         # make cage
         if cage_settings == "AUTO":
-            cage = make_cage(lowpoly)
+            with stats.stage("make_cage", lowpoly):
+                cage = make_cage(lowpoly, cage_offsets)
             bpy.context.scene.render.bake.use_cage = True
             bpy.context.scene.render.bake.cage_object = cage
             bpy.context.scene.render.bake.cage_extrusion = 0
@@ -109,32 +595,277 @@ def bake_process(highpoly, lowpoly):
             bpy.context.scene.render.bake.cage_extrusion = extrusion
             bpy.context.scene.render.bake.max_ray_distance = ray_dist
 
-        # normals
-        if is_normal_bake_on:
-            # setup nodes
-            normal_image = new_image("normal", non_color=True, use_float=False)
-            normal_texture = new_node(nodes, (-500, -150), image=normal_image)
-            normal_map = new_node(nodes, (-200, -175), "ShaderNodeNormalMap")
-            links.new(normal_texture.outputs[0], normal_map.inputs[1])
-            links.new(normal_map.outputs[0], principled.inputs[22])
-            nodes.active = normal_texture
-
-            # bake normals
-            bake("NORMAL", highpoly, lowpoly)
-            save_image(normal_image)
-
-        # diffuse
-        if is_diffuse_bake_on:
-            # setup nodes
-            diffuse_image = new_image("diffuse")
-            diffuse_texture = new_node(nodes, (-500, 300), image=diffuse_image)
-            links.new(diffuse_texture.outputs[0], principled.inputs[0])
-            nodes.active = diffuse_texture
-
-            # bake diffuse
-            bake("DIFFUSE", highpoly, lowpoly)
-            save_image(diffuse_image)
-
-        # remove cage
-        if cage_settings == "AUTO":
-            bpy.data.objects.remove(cage, do_unlink=True)
+        # the same material, cage and settings are used for every map
+        try:
+            for m in cycles_maps:
+                yield "bake_" + m.name
+                nodes.active = textures[m.bake_type]
+                samples = bake_adaptive(
+                    m.bake_type, highpoly, lowpoly, images[m.bake_type]
+                )
+                print("AutoLow: baked " + m.name + " with " + str(samples) + " samples")
+        finally:
+            # remove cage, also when the run is cancelled between maps
+            if cage_settings == "AUTO":
+                bpy.data.objects.remove(cage, do_unlink=True)
+
+    yield "save_images"
+    for m in pending:
+        # maps are cached once they are on disk
+        done = None
+        if m.name in keys:
+            done = partial(cache.store_image, keys[m.name], images[m.bake_type])
+        if m.bake_type in saved:
+            if done is not None:
+                done()
+        else:
+            file_format, bit_depth = get_save_format(m)
+            save_image(images[m.bake_type], file_format, bit_depth, done=done)
+        if mesh_hash is not None:
+            # background writes only create the file once it's complete
+            filepath = images[m.bake_type].filepath_raw
+            journal.mark_map(highpoly.name, m.bake_type, filepath, mesh_hash)
+
+
+def get_save_format(m):
+    # file format and bit depth a map is saved with
+    props = get_props()
+    if m.bake_type == "NORMAL" and props.use_exr_normals:
+        return "OPEN_EXR", 32
+    if m.non_color and props.use_16_bit and props.use_async_save:
+        return "PNG", 16
+    return "PNG", 8
+
+
+def add_map_nodes(bake_type, image, index, nodes, links, principled):
+    # add the image node of a map and connect it to the material
+    if bake_type == "NORMAL":
+        texture = new_node(nodes, (-500, -150), image=image)
+        normal_map = new_node(nodes, (-200, -175), "ShaderNodeNormalMap")
+        links.new(texture.outputs[0], normal_map.inputs[1])
+        links.new(normal_map.outputs[0], principled.inputs[22])
+    elif bake_type == "DIFFUSE":
+        texture = new_node(nodes, (-500, 300), image=image)
+        links.new(texture.outputs[0], principled.inputs[0])
+    elif bake_type in {"ROUGHNESS", "METALLIC"}:
+        location = (-500, 100) if bake_type == "ROUGHNESS" else (-500, 0)
+        texture = new_node(nodes, location, image=image)
+        socket = "Roughness" if bake_type == "ROUGHNESS" else "Metallic"
+        links.new(texture.outputs[0], principled.inputs[socket])
+    elif bake_type == "HEIGHT":
+        texture = new_node(nodes, (-500, -450), image=image)
+        displacement = new_node(nodes, (-200, -450), "ShaderNodeDisplacement")
+        output = nodes.get("Material Output")
+        links.new(texture.outputs[0], displacement.inputs["Height"])
+        links.new(displacement.outputs[0], output.inputs["Displacement"])
+    else:
+        # maps that aren't used by the material are stacked on the left
+        texture = new_node(nodes, (-900, 300 - index * 300), image=image)
+    return texture
+
+
+def lod_process(lowpoly, base_name):
+    # every level is decimated from the previous one, the uvs and the material
+    # are kept so all levels use the same bake
+    props = get_props()
+    lods = [lowpoly]
+    for level in range(1, props.lod_count + 1):
+        previous = lods[-1]
+        lod = copy_obj(previous)
+        lod.name = base_name + "_LOD" + str(level)
+        lod.modifiers.clear()
+        decimate = lod.modifiers.new("Autolow_Decimate", "DECIMATE")
+        decimate.ratio = props.lod_ratio
+        with stats.stage("lod_" + str(level), lod):
+            apply_modifiers(lod)
+        lods.append(lod)
+    return lods
+
+
+def run_steps(steps):
+    # run the steps of a pipeline generator to the end and return its result
+    while True:
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return stop.value
+
+
+def prepare_lowpoly(highpoly):
+    # make the lowpoly of an object, remeshed and unwrapped but not baked
+    return run_steps(prepare_steps(highpoly))
+
+
+def prepare_steps(highpoly, high=None):
+    props = get_props()
+
+    stats.begin_object(highpoly.name)
+    highpoly.hide_set(False)
+
+    lowpoly = journal.get_lowpoly(highpoly.name, "unwrap")
+    if lowpoly is not None:
+        # remeshed and unwrapped by a run that didn't finish
+        print("AutoLow: using " + lowpoly.name + " of the last run")
+        return lowpoly
+
+    lowpoly = journal.get_lowpoly(highpoly.name, "remesh")
+    if lowpoly is not None:
+        # remeshed by a run that stopped before unwrapping, only unwrap again
+        print("AutoLow: unwrapping " + lowpoly.name + " of the last run")
+    else:
+        yield "remesh"
+        lowpoly = copy_obj(highpoly)
+        if props.lod_count > 0:
+            lowpoly.name = highpoly.name + "_LOD0"
+        else:
+            lowpoly.name = highpoly.name + "_LP"
+
+        # shade smooth and turn off autosmooth
+        shade_smooth(lowpoly.data)
+        highpoly.data.use_auto_smooth = False
+        lowpoly.data.use_auto_smooth = False
+
+        lowpoly = remesh_process(highpoly, lowpoly, high)
+        if (props.unwrap_method != "NONE" or props.bake_method != "NONE") and len(
+            lowpoly.data.polygons
+        ) == 0:
+            raise AutolowError("The mesh has 0 polygons after remeshing")
+        journal.mark_stage(highpoly.name, "remesh", lowpoly)
+
+    yield "unwrap"
+    uv_unwrap_process(lowpoly)
+    journal.mark_stage(highpoly.name, "unwrap", lowpoly)
+    return lowpoly
+
+
+def export_process(name, lowpolys):
+    # one file with all levels of an object, right after the object finished
+    # instead of in a pass over all objects at the end
+    props = get_props()
+    extension = {"GLTF": ".glb", "FBX": ".fbx", "OBJ": ".obj"}[props.export_format]
+    filepath = str(get_export_dir() / (name + extension))
+
+    # the exporters read the saved images, so the background writes finish first
+    for error in flush_images():
+        print("AutoLow: image couldn't be saved: " + error)
+    with stats.stage("export", lowpolys[0]):
+        export_objects(lowpolys, filepath, props.export_format)
+    print("AutoLow: exported " + filepath)
+
+
+def finish_lowpoly(highpoly, lowpoly):
+    return run_steps(finish_steps(highpoly, lowpoly))
+
+
+def finish_steps(highpoly, lowpoly):
+    props = get_props()
+    yield "lods"
+    highpoly.hide_set(True)
+    lowpoly.modifiers.clear()
+    lowpolys = lod_process(lowpoly, highpoly.name)
+    if props.export_format != "NONE":
+        yield "export"
+        export_process(highpoly.name, lowpolys)
+    journal.mark_done(highpoly.name, lowpolys)
+    return lowpolys
+
+
+def process_object(highpoly):
+    # run the whole pipeline on one object and return the new lowpolys,
+    # the first one is the most detailed
+    return run_steps(object_steps(highpoly))
+
+
+def object_steps(highpoly):
+    # the pipeline of one object as steps, so a runner can stop between them
+    # the highpoly bvh is built once for the remesh and the bake
+    high = hitbuffer.HighpolySurface(highpoly)
+    lowpoly = yield from prepare_steps(highpoly, high)
+    yield from bake_steps(highpoly, lowpoly, high=high)
+    journal.mark_stage(highpoly.name, "bake")
+    return (yield from finish_steps(highpoly, lowpoly))
+
+
+def group_duplicates(highpolys, get_settings):
+    # objects that would get the same result, the first object of every group
+    # is processed and the others reuse its lowpolys
+    groups = {}
+    hashes = {}
+    for highpoly in highpolys:
+        if highpoly.modifiers:
+            # the evaluated meshes can differ even if the meshes are the same
+            key = highpoly
+        else:
+            mesh = highpoly.data
+            if mesh not in hashes:
+                # objects that share a mesh are hashed once, the uvs decide
+                # where the textures of the materials land
+                hashes[mesh] = cache.hash_mesh(mesh, use_uvs=True)
+            key = (
+                hashes[mesh],
+                tuple(round(value, 4) for value in highpoly.matrix_world.to_scale()),
+                tuple(slot.material for slot in highpoly.material_slots),
+                tuple(sorted(get_settings(highpoly).items())),
+            )
+        groups.setdefault(key, []).append(highpoly)
+    return {group[0]: group[1:] for group in groups.values()}
+
+
+def link_duplicate(source, highpoly, lowpolys):
+    # new objects in place of the duplicate that share the meshes and the
+    # material of the lowpolys of the source
+    copies = []
+    for lowpoly in lowpolys:
+        copy = lowpoly.copy()
+        if lowpoly.name.startswith(source.name):
+            copy.name = highpoly.name + lowpoly.name[len(source.name) :]
+        else:
+            copy.name = highpoly.name + "_LP"
+        copy.parent = highpoly.parent
+        copy.matrix_parent_inverse = highpoly.matrix_parent_inverse.copy()
+        copy.matrix_basis = highpoly.matrix_basis.copy()
+        get_collection(highpoly).objects.link(copy)
+        copies.append(copy)
+    highpoly.hide_set(True)
+    if get_props().export_format != "NONE":
+        export_process(highpoly.name, copies)
+    journal.mark_done(highpoly.name, copies)
+    print("AutoLow: " + highpoly.name + " reuses the result of " + source.name)
+    return copies
+
+
+def process_atlas(highpolys):
+    # run the pipeline on several objects that share one uv layout and one bake,
+    # return the lowpolys of every object
+    props = get_props()
+    lowpolys = [prepare_lowpoly(highpoly) for highpoly in highpolys]
+
+    stats.begin_object("Atlas")
+    for lowpoly in lowpolys:
+        if lowpoly.data.uv_layers.active is None:
+            raise AutolowError(lowpoly.name + " has no UVs to pack into the atlas")
+    with stats.stage("pack_atlas"):
+        pack_atlas(lowpolys, get_uv_margin())
+
+    if props.bake_method != "NONE":
+        # the objects are joined into temporary objects and baked once,
+        # multires can't be joined so normals are always transferred
+        with stats.stage("join_atlas"):
+            highpoly = join_objects(highpolys, "Autolow_Atlas_High")
+            lowpoly = join_objects(lowpolys, "Autolow_Atlas_Low")
+            # cycles bakes into every material slot, the bake material is the
+            # only one
+            set_single_material_slot(lowpoly.data)
+        try:
+            bake_process(highpoly, lowpoly, transfer_normals=True)
+            material = lowpoly.active_material
+        finally:
+            remove_object(highpoly)
+            remove_object(lowpoly)
+        for obj in lowpolys:
+            obj.active_material = material
+
+    return [
+        finish_lowpoly(highpoly, lowpoly)
+        for highpoly, lowpoly in zip(highpolys, lowpolys)
+    ]
@@ -1,22 +1,156 @@
 import bpy
 from bpy.types import Operator
 from bpy_extras.io_utils import ImportHelper
-from .autolow_main import remesh_process, uv_unwrap_process, bake_process
-from .autolow_utils import get_props, save, copy_obj
+from .autolow_main import (
+    object_steps,
+    process_atlas,
+    group_duplicates,
+    link_duplicate,
+)
+from .autolow_parallel import run_parallel
+from . import autolow_stats as stats
+from . import autolow_journal as journal
+from . import autolow_estimate as estimate
+from . import autolow_progress as progress
+from .autolow_utils import (
+    get_props,
+    get_uv_margin,
+    calc_uv_coverage,
+    pack_atlas,
+    save,
+    check_object,
+    deselect_all,
+    set_active,
+    flush_images,
+    override_settings,
+    AutolowError,
+)
+from .autolow_props import OVERRIDE_FIELDS
+import fnmatch
 import pathlib
+import traceback
 
 
 class AUTOLOW_OT_start(Operator):
     bl_idname = "autolow.start"
     bl_label = "Start Process"
-    bl_description = "Start process"
+    bl_description = (
+        "Start process. From the panel the queue runs in the background"
+        " and can be cancelled between steps"
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return not progress.is_running
 
     def execute(self, context):
+        objects = self.setup(context)
+        if objects is None:
+            return {"CANCELLED"}
+
+        objects = self.run_blocking(context, objects)
+        if objects is None:
+            return {"CANCELLED"}
+
+        try:
+            for _ in self.queue_steps(context, objects):
+                pass
+        except Exception as error:
+            # the images of the finished objects are still written
+            for message in flush_images():
+                self.report({"WARNING"}, "Image couldn't be saved: " + message)
+            self.report_error(error)
+            return {"CANCELLED"}
+
+        self.finish(context)
+        return {"FINISHED"}
+
+    def invoke(self, context, event):
+        objects = self.setup(context)
+        if objects is None:
+            return {"CANCELLED"}
+
+        # atlas bakes and parallel workers still run in one call
+        objects = self.run_blocking(context, objects)
+        if objects is None:
+            return {"CANCELLED"}
+        if not objects:
+            self.finish(context)
+            return {"FINISHED"}
+
+        progress.begin(len(objects))
+        self.steps = self.queue_steps(context, objects)
+        wm = context.window_manager
+        self.timer = wm.event_timer_add(0.1, window=context.window)
+        wm.modal_handler_add(self)
+        return {"RUNNING_MODAL"}
+
+    def modal(self, context, event):
+        if event.type == "ESC":
+            progress.cancel()
+        elif event.type != "TIMER":
+            return {"PASS_THROUGH"}
+
+        if progress.is_cancelled:
+            # the steps are closed between two steps, so nothing is half done
+            try:
+                self.steps.close()
+            finally:
+                self.stop(context)
+            self.report(
+                {"WARNING"},
+                "Cancelled at " + progress.current_object + ", start again to resume",
+            )
+            return {"CANCELLED"}
+
+        # one step runs on every timer event, the ui updates in between
+        try:
+            step = next(self.steps)
+        except StopIteration:
+            self.stop(context)
+            self.finish(context)
+            return {"FINISHED"}
+        except Exception as error:
+            # any error ends the run, otherwise the timer keeps running
+            self.stop(context)
+            self.report_error(error)
+            return {"CANCELLED"}
+
+        progress.set_step(step)
+        if self.item is not None:
+            self.item.status = step
+        redraw(context)
+        return {"RUNNING_MODAL"}
+
+    def save_after(self):
+        # baked images only become file images once they are written, a file
+        # saved before that would keep them as blank generated images
+        for error in flush_images():
+            self.report({"WARNING"}, "Image couldn't be saved: " + error)
+        save()
+
+    def report_error(self, error):
+        if not isinstance(error, AutolowError):
+            # errors of blender operators and bugs, the traceback helps
+            traceback.print_exc()
+        self.report({"ERROR"}, str(error))
+
+    def stop(self, context):
+        context.window_manager.event_timer_remove(self.timer)
+        progress.end()
+        # images of the finished steps are written, a cancelled run resumes
+        # from them
+        for error in flush_images():
+            self.report({"WARNING"}, "Image couldn't be saved: " + error)
+        redraw(context)
+
+    def setup(self, context):
+        # check the settings and return the objects to process, or None
         props = get_props()
 
         if not save():
             self.report({"WARNING"}, "Save file before activating autosave")
-            return {"CANCELLED"}
+            return None
 
         if props.is_image_saved:
             path = props.image_path
@@ -32,7 +166,7 @@ class AUTOLOW_OT_start(Operator):
                         ),
                     )
                     props.image_path = default
-                    return {"CANCELLED"}
+                    return None
             elif bpy.data.filepath == "":
                 # check if file has been saved
                 self.report(
@@ -42,58 +176,214 @@ class AUTOLOW_OT_start(Operator):
                         " Either save the blender file or set the path in settings"
                     ),
                 )
-                return {"CANCELLED"}
+                return None
 
+        if props.is_tiled_bake and not props.is_image_saved:
+            self.report({"ERROR"}, "Tiled baking needs 'Save Images' to be on")
+            return None
+
+        stats.reset()
+        journal.begin()
         autolow_queue = context.scene.queue
         objects = []
+        # objects that stay in the queue after the run
+        self.kept = set()
+        # queue items of the objects, looked up once for the whole run
+        self.items = {}
         if len(autolow_queue) > 0:
-            for object in autolow_queue:
-                current = bpy.data.objects[object.name]
+            for item in autolow_queue:
+                current = get_item_object(item)
+                if current is None:
+                    self.report({"WARNING"}, item.name + " isn't in the file anymore")
+                    continue
+                item.obj = current
+                item.name = current.name
+                item.status = ""
                 current.select_set(False)
                 objects.append(current)
+                self.items[current] = item
+            if not objects:
+                return None
         else:
             active_object = bpy.context.active_object
-            if not active_object:
-                self.report({"ERROR"}, "No object selected")
-                return {"CANCELLED"}
-            if active_object.type != "MESH":
-                self.report({"ERROR"}, "Object must be a mesh")
-                return {"CANCELLED"}
-            if len(active_object.data.polygons) == 0:
-                self.report({"ERROR"}, "The mesh must have more than 0 polygons")
-                return {"CANCELLED"}
+            error = check_object(active_object)
+            if error is not None:
+                self.report({"ERROR"}, error)
+                return None
             objects.append(active_object)
 
-        for highpoly in objects:
-            highpoly.hide_set(False)
-            lowpoly = copy_obj(highpoly)
-            lowpoly.name = highpoly.name + "_LP"
-
-            # shade smooth and turn off autosmooth
-            bpy.ops.object.shade_smooth()
-            highpoly.data.use_auto_smooth = False
-            lowpoly.data.use_auto_smooth = False
-
-            remesh_process(highpoly, lowpoly)
-            if (props.unwrap_method != "NONE" or props.bake_method != "NONE") and len(
-                lowpoly.data.polygons
-            ) == 0:
-                self.report({"ERROR"}, "The mesh has 0 polygons after remeshing")
-                return {"CANCELLED"}
-            uv_unwrap_process()
-            bake_process(highpoly, lowpoly)
+        # objects estimated over the limits are held back before anything runs
+        if props.max_minutes > 0 or props.max_memory > 0:
+            objects, rejected = self.preflight(context, objects)
+            if props.limit_action == "LAST":
+                objects.extend(rejected)
+            else:
+                self.kept.update(rejected)
+            if not objects:
+                return None
+
+        return objects
 
-            highpoly.hide_set(True)
-            lowpoly.modifiers.clear()
+    def run_blocking(self, context, objects):
+        # atlas bakes and parallel workers, returns the objects left for the
+        # serial loop or None if the run failed
+        props = get_props()
+        self.lowpoly = None
+        self.item = None
+
+        if props.is_atlas_bake and len(objects) > 1:
+            # all objects are baked together in this process, so overrides of
+            # the queue items aren't used
+            try:
+                lowpolys = process_atlas(objects)
+            except AutolowError as error:
+                self.report({"ERROR"}, str(error))
+                return None
+            if props.autosave_after:
+                self.save_after()
+            self.lowpoly = lowpolys[-1][0]
+            objects = []
+
+        if props.worker_count > 1 and len(objects) > 1:
+            if bpy.data.filepath == "":
+                self.report({"ERROR"}, "Save file before using parallel workers")
+                return None
+            overrides = {
+                obj.name: get_overrides(self.items.get(obj)) for obj in objects
+            }
+            failed = run_parallel(objects, overrides)
+            for result in failed:
+                # results of a whole asset have no object
+                name = result["object"] or result["file"]
+                self.report({"ERROR"}, name + ": " + str(result["error"]))
             if props.autosave_after:
-                save()
+                self.save_after()
+            if failed:
+                return None
+            objects = []
+
+        # objects with the same mesh are only processed once
+        self.duplicates = {}
+        if props.use_duplicates and len(objects) > 1:
+            self.duplicates = group_duplicates(
+                objects,
+                lambda obj: get_overrides(self.items.get(obj)),
+            )
+            objects = list(self.duplicates)
+
+        return objects
+
+    def queue_steps(self, context, objects):
+        # the serial loop as steps, the name of the next step is yielded
+        props = get_props()
+        for index, highpoly in enumerate(objects):
+            progress.set_object(index, highpoly.name)
+            item = self.items.get(highpoly)
+            self.item = item
+
+            # objects finished by a run that didn't finish are skipped
+            lowpolys = journal.get_lowpolys(highpoly.name)
+            if lowpolys is None:
+                with override_settings(get_overrides(item)):
+                    lowpolys = yield from object_steps(highpoly)
+                if props.autosave_after:
+                    self.save_after()
+            else:
+                highpoly.hide_set(True)
+
+            self.lowpoly = lowpolys[0]
+            if item is not None:
+                item.status = "Done"
+
+            for duplicate in self.duplicates.get(highpoly, []):
+                if journal.get_lowpolys(duplicate.name) is None:
+                    link_duplicate(highpoly, duplicate, lowpolys)
+                duplicate_item = self.items.get(duplicate)
+                if duplicate_item is not None:
+                    duplicate_item.status = "Done"
+        progress.set_object(len(objects), "")
+
+    def finish(self, context):
+        props = get_props()
+
+        # the pipeline doesn't touch the selection, select the result here
+        if self.lowpoly is not None:
+            deselect_all()
+            set_active(self.lowpoly)
+
+        # wait for the images that are still being written
+        for error in flush_images():
+            self.report({"WARNING"}, "Image couldn't be saved: " + error)
+
+        # the whole queue is done, the next run starts from the beginning
+        journal.end()
+
+        # remove the processed items from the queue, skipped objects stay
+        queue = context.scene.queue
+        for index in reversed(range(len(queue))):
+            if queue[index].obj not in self.kept:
+                queue.remove(index)
+        context.scene.queue_index = min(context.scene.queue_index, len(queue) - 1)
+
+        if props.is_stats_exported:
+            self.export_stats()
+
+    def preflight(self, context, objects):
+        # split the objects into the ones within the limits and the rest
+        accepted = []
+        rejected = []
+        for obj in objects:
+            item = self.items.get(obj)
+            with override_settings(get_overrides(item)):
+                _, _, seconds, memory = estimate.estimate_object(obj)
+            reason = estimate.check_limits(seconds, memory)
+            if item is not None:
+                item.est_seconds = seconds
+                item.est_memory = memory
+                item.rejected = reason or ""
+            if reason is None:
+                accepted.append(obj)
+            else:
+                self.report({"WARNING"}, obj.name + " is over the limits: " + reason)
+                rejected.append(obj)
+        return accepted, rejected
+
+    def export_stats(self):
+        props = get_props()
+        path = props.stats_path
+        if path.startswith("//") and bpy.data.filepath == "":
+            self.report({"WARNING"}, "Save file to export stats next to it")
+            return
+        try:
+            path = stats.export(path, props.stats_format)
+        except OSError as error:
+            self.report({"WARNING"}, "Stats couldn't be exported: " + str(error))
+        else:
+            self.report({"INFO"}, "Stats: " + str(path))
+
 
-        # remove all items from queue
-        context.scene.queue.clear()
+class AUTOLOW_OT_cancel(Operator):
+    bl_idname = "autolow.cancel"
+    bl_label = "Cancel"
+    bl_description = "Stop the run after the current step. Start again to resume"
 
+    @classmethod
+    def poll(cls, context):
+        return progress.is_running and not progress.is_cancelled
+
+    def execute(self, context):
+        progress.cancel()
         return {"FINISHED"}
 
 
+def redraw(context):
+    if context.screen is None:
+        return
+    for area in context.screen.areas:
+        if area.type == "VIEW_3D":
+            area.tag_redraw()
+
+
 class AUTOLOW_OT_set_workflow(Operator):
     bl_idname = "autolow.set_workflow"
     bl_label = "Set Workflow"
@@ -111,17 +401,20 @@ class AUTOLOW_OT_set_workflow(Operator):
         if workflow == "FULL":
             if remesher == "NONE":
                 props.remesher = "VOXEL"
-            props.unwrap_method = "SMART"
+            if props.unwrap_method == "NONE":
+                props.unwrap_method = "SMART"
             props.bake_method = "TRANSFER"
 
         elif workflow == "TRANSFER_BAKE":
             props.remesher = "NONE"
-            props.unwrap_method = "SMART"
+            if props.unwrap_method == "NONE":
+                props.unwrap_method = "SMART"
             props.bake_method = "TRANSFER"
 
         elif workflow == "ACTIVE_BAKE":
             props.remesher = "NONE"
-            props.unwrap_method = "SMART"
+            if props.unwrap_method == "NONE":
+                props.unwrap_method = "SMART"
             props.bake_method = "ACTIVE"
 
         else:
@@ -132,6 +425,110 @@ class AUTOLOW_OT_set_workflow(Operator):
         return {"FINISHED"}
 
 
+class AUTOLOW_OT_pack_atlas(Operator):
+    bl_idname = "autolow.pack_atlas"
+    bl_label = "Pack Atlas"
+    bl_description = (
+        "Pack the UVs of the selected objects into one shared layout,"
+        " with the padding of the bake resolution"
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return any(obj.type == "MESH" for obj in context.selected_objects)
+
+    def execute(self, context):
+        objects = [obj for obj in context.selected_objects if obj.type == "MESH"]
+        if context.active_object in objects:
+            # the active object leads edit mode
+            objects.remove(context.active_object)
+            objects.insert(0, context.active_object)
+        for obj in objects:
+            if obj.data.uv_layers.active is None:
+                self.report({"ERROR"}, obj.name + " has no UVs to pack")
+                return {"CANCELLED"}
+
+        pack_atlas(objects, get_uv_margin())
+
+        coverage = sum(calc_uv_coverage(obj.data) for obj in objects)
+        self.report({"INFO"}, "Atlas coverage: " + format(coverage * 100, ".1f") + "%")
+        return {"FINISHED"}
+
+
+class AUTOLOW_OT_estimate(Operator):
+    bl_idname = "autolow.estimate"
+    bl_label = "Estimate"
+    bl_description = (
+        "Analyze the queued objects and estimate the time and memory"
+        " the current settings need"
+    )
+
+    def execute(self, context):
+        queue = context.scene.queue
+        if len(queue) > 0:
+            items = [(item, get_item_object(item)) for item in queue]
+        else:
+            items = [(None, context.active_object)]
+
+        total = 0
+        peak = 0
+        for item, obj in items:
+            if item is not None and obj is None:
+                self.report({"WARNING"}, item.name + " isn't in the file anymore")
+                continue
+            error = check_object(obj)
+            if error is not None:
+                self.report({"ERROR"}, error)
+                return {"CANCELLED"}
+            with override_settings(get_overrides(item)):
+                analysis, stages, seconds, memory = estimate.estimate_object(obj)
+            total += seconds
+            peak = max(peak, memory)
+
+            print(
+                "AutoLow: "
+                + obj.name
+                + ": "
+                + str(analysis["faces"])
+                + " faces, "
+                + ("manifold" if analysis["is_manifold"] else "not manifold")
+                + ", size "
+                + format(analysis["size"], ".3g")
+                + ", edges "
+                + format(analysis["avg_edge_length"], ".3g")
+            )
+            lines = [
+                name
+                + ": "
+                + format(stage_seconds, ".1f")
+                + " s, "
+                + format(stage_bytes / (1024 * 1024), ".0f")
+                + " MB"
+                for name, stage_seconds, stage_bytes in stages
+            ]
+            for line in lines:
+                print("    " + line)
+            if item is not None:
+                item.est_seconds = seconds
+                item.est_memory = memory
+                item.est_stages = ";".join(lines)
+                item.rejected = estimate.check_limits(seconds, memory) or ""
+            else:
+                # without a queue the breakdown is shown in the report
+                for line in lines:
+                    self.report({"INFO"}, line)
+
+        self.report(
+            {"INFO"},
+            "Estimated "
+            + format(total / 60, ".1f")
+            + " min, peak "
+            + format(peak, ".0f")
+            + " MB",
+        )
+        return {"FINISHED"}
+
+
 class AUTOLOW_OT_open_filebrowser(Operator, ImportHelper):
     bl_idname = "autolow.open_filebrowser"
     bl_label = "Set Path"
@@ -185,13 +582,104 @@ class AUTOLOW_OT_queue_actions(Operator):
                 scn.queue_index -= 1
                 scn.queue.remove(idx)
         if self.action == "ADD":
-            if context.object.type != "MESH":
-                self.report({"ERROR"}, "Object must be a mesh")
-            elif context.object:
-                item = scn.queue.add()
-                item.name = context.object.name
-                item.obj_id = len(scn.queue)
-                scn.queue_index = len(scn.queue) - 1
-            else:
+            if not context.object:
                 self.report({"INFO"}, "Nothing selected in the Viewport")
+            elif context.object.type != "MESH":
+                self.report({"ERROR"}, "Object must be a mesh")
+            elif get_queue_item(scn, context.object) is None:
+                add_queue_item(scn, context.object)
+        return {"FINISHED"}
+
+
+class AUTOLOW_OT_queue_add(Operator):
+    bl_idname = "autolow.queue_add"
+    bl_label = "Add Objects"
+    bl_description = "Add many mesh objects to the queue at once"
+    bl_options = {"REGISTER", "UNDO"}
+
+    source: bpy.props.EnumProperty(
+        name="From",
+        items=(
+            ("SELECTED", "Selection", "Add the selected objects"),
+            ("COLLECTION", "Collection", "Add the objects of a collection"),
+            ("PATTERN", "Name", "Add the objects with names matching a pattern"),
+        ),
+    )
+    collection: bpy.props.StringProperty(name="Collection")
+    pattern: bpy.props.StringProperty(
+        name="Pattern",
+        default="*",
+        description="Name pattern with * and ? wildcards, like 'Scan_*'",
+    )
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "source", expand=True)
+        if self.source == "COLLECTION":
+            layout.prop_search(self, "collection", bpy.data, "collections")
+        elif self.source == "PATTERN":
+            layout.prop(self, "pattern")
+
+    def execute(self, context):
+        scene = context.scene
+        if self.source == "SELECTED":
+            objects = context.selected_objects
+        elif self.source == "COLLECTION":
+            collection = bpy.data.collections.get(self.collection)
+            if collection is None:
+                self.report({"ERROR"}, "Collection not found")
+                return {"CANCELLED"}
+            # objects of child collections are added too
+            objects = collection.all_objects
+        else:
+            objects = [
+                obj
+                for obj in scene.objects
+                if fnmatch.fnmatchcase(obj.name, self.pattern)
+            ]
+
+        # the queue is searched once instead of for every object
+        queued = {item.obj for item in scene.queue if item.obj is not None}
+        count = 0
+        for obj in objects:
+            if obj.type == "MESH" and obj not in queued:
+                add_queue_item(scene, obj)
+                queued.add(obj)
+                count += 1
+
+        self.report({"INFO"}, "Added " + str(count) + " objects to the queue")
         return {"FINISHED"}
+
+
+def add_queue_item(scene, obj):
+    item = scene.queue.add()
+    item.name = obj.name
+    item.obj = obj
+    item.obj_id = len(scene.queue)
+    scene.queue_index = len(scene.queue) - 1
+    return item
+
+
+def get_item_object(item):
+    # queues of older files only have the name
+    if item.obj is None:
+        return bpy.data.objects.get(item.name)
+    return item.obj
+
+
+def get_queue_item(scene, obj):
+    # the queue item of an object, None if it isn't queued
+    for item in scene.queue:
+        if item.obj == obj:
+            return item
+    return None
+
+
+def get_overrides(item):
+    # the settings a queue item overrides
+    if item is None or not item.use_overrides:
+        return {}
+    return {field: getattr(item, field) for field in OVERRIDE_FIELDS}
@@ -0,0 +1,174 @@
+import bpy
+import json
+import os
+import pathlib
+import shutil
+import subprocess
+import tempfile
+from .autolow_utils import get_props, get_image_dir
+from . import autolow_stats as stats
+
+
+# parallel queue processing
+# queue items are split between worker blender processes that each run the
+# batch runner on a snapshot of the current file, the lowpolys are then
+# appended back into this file
+
+
+def run_parallel(objects, overrides=None):
+    # overrides are the settings of every object that differ from the file
+    props = get_props()
+    worker_count = min(props.worker_count, len(objects))
+    threads = get_worker_threads(worker_count)
+
+    workdir = pathlib.Path(tempfile.mkdtemp(prefix="autolow_"))
+    try:
+        # snapshot of the file that all workers read from
+        snapshot = workdir / "snapshot.blend"
+        bpy.ops.wm.save_as_mainfile(filepath=str(snapshot), copy=True)
+
+        settings = get_worker_settings()
+        workers = []
+        for index in range(worker_count):
+            chunk = objects[index::worker_count]
+            chunk_overrides = {
+                obj.name: overrides[obj.name]
+                for obj in chunk
+                if overrides and overrides.get(obj.name)
+            }
+            workers.append(
+                start_worker(
+                    workdir, index, snapshot, chunk, settings, chunk_overrides, threads
+                )
+            )
+
+        results = []
+        for index, (process, output, results_path) in enumerate(workers):
+            process.wait()
+            worker_results = merge_worker(output, results_path)
+            # objects without a result were lost when the worker crashed
+            done = {r["object"] for r in worker_results}
+            for obj in objects[index::worker_count]:
+                if obj.name not in done:
+                    error = "Worker exited with code " + str(process.returncode)
+                    worker_results.append(
+                        {"object": obj.name, "status": "error", "error": error}
+                    )
+            results.extend(worker_results)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    # hide highpolys like the serial process does
+    for highpoly in objects:
+        if any(r["object"] == highpoly.name and r["status"] == "ok" for r in results):
+            highpoly.hide_set(True)
+
+    return [r for r in results if r["status"] != "ok"]
+
+
+def get_worker_threads(worker_count):
+    threads = get_props().threads_per_worker
+    if threads == 0:
+        # split cores evenly between workers
+        threads = max(1, (os.cpu_count() or 1) // worker_count)
+    return threads
+
+
+def get_worker_settings():
+    props = get_props()
+    # copy all addon settings so workers behave like this file
+    settings = {}
+    for prop in props.bl_rna.properties:
+        if prop.identifier in {"rna_type", "name"} or prop.is_readonly:
+            continue
+        if prop.type not in {"BOOLEAN", "INT", "FLOAT", "STRING", "ENUM"}:
+            continue
+        if getattr(prop, "is_array", False) or getattr(prop, "is_enum_flag", False):
+            continue
+        settings[prop.identifier] = getattr(props, prop.identifier)
+    # the snapshot is in a temporary folder, so resolve the paths here
+    if props.is_image_saved:
+        settings["image_path"] = bpy.path.abspath(get_image_dir())
+    settings["export_path"] = bpy.path.abspath(props.export_path)
+    if props.cache_path != "":
+        settings["cache_path"] = bpy.path.abspath(props.cache_path)
+    # workers must not start more workers
+    settings["worker_count"] = 1
+    return settings
+
+
+def start_worker(workdir, index, snapshot, objects, settings, overrides, threads):
+    manifest_path = workdir / ("worker_" + str(index) + ".json")
+    results_path = workdir / ("worker_" + str(index) + ".jsonl")
+    output = workdir / ("worker_" + str(index) + ".blend")
+
+    manifest = {
+        "settings": settings,
+        "assets": [
+            {
+                "file": str(snapshot),
+                "objects": [obj.name for obj in objects],
+                "object_settings": overrides,
+                "save_as": str(output),
+                "pack_images": True,
+            }
+        ],
+    }
+    with open(manifest_path, "w") as file:
+        json.dump(manifest, file)
+
+    addon = __package__
+    process = subprocess.Popen(
+        [
+            bpy.app.binary_path,
+            "-b",
+            "--addons",
+            addon,
+            "-t",
+            str(threads),
+            "--python-expr",
+            "import " + addon + ".autolow_batch as b; b.main()",
+            "--",
+            str(manifest_path),
+            str(results_path),
+        ]
+    )
+
+    if get_props().use_core_affinity and hasattr(os, "sched_setaffinity"):
+        # pin each worker to its own block of cores
+        first = index * threads
+        core_count = os.cpu_count() or 1
+        cores = {core % core_count for core in range(first, first + threads)}
+        try:
+            os.sched_setaffinity(process.pid, cores)
+        except OSError:
+            pass
+
+    return process, output, results_path
+
+
+def merge_worker(output, results_path):
+    if not results_path.is_file():
+        return []
+    with open(results_path) as file:
+        results = [json.loads(line) for line in file if line.strip()]
+    for result in results:
+        stats.records.extend(result.get("stages", []))
+
+    names = []
+    for result in results:
+        if result["status"] == "ok":
+            names.append(result["lowpoly"])
+            names.extend(result.get("lods", []))
+    if not names or not output.is_file():
+        return results
+
+    with bpy.data.libraries.load(str(output), link=False) as (data_from, data_to):
+        data_to.objects = [name for name in data_from.objects if name in names]
+
+    collection = bpy.context.collection
+    for obj in data_to.objects:
+        if obj is not None:
+            collection.objects.link(obj)
+
+    return results
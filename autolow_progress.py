@@ -0,0 +1,66 @@
+import time
+from bpy.app.handlers import persistent
+
+
+# progress of the run started from the ui, the runner advances one step on
+# every timer event and the panels draw this state
+
+is_running = False
+is_cancelled = False
+total = 0
+index = 0
+current_object = ""
+current_step = ""
+start_time = 0.0
+
+
+def begin(count):
+    global is_running, is_cancelled, total, index, current_object, current_step
+    global start_time
+    is_running = True
+    is_cancelled = False
+    total = count
+    index = 0
+    current_object = ""
+    current_step = ""
+    start_time = time.perf_counter()
+
+
+def set_object(i, name):
+    global index, current_object, current_step
+    index = i
+    current_object = name
+    current_step = ""
+
+
+def set_step(name):
+    global current_step
+    current_step = name
+
+
+def cancel():
+    # the runner stops before the next step
+    global is_cancelled
+    is_cancelled = True
+
+
+def end():
+    global is_running
+    is_running = False
+
+
+def get_elapsed():
+    return time.perf_counter() - start_time
+
+
+def get_factor():
+    # finished objects of the run, between 0 and 1
+    if total == 0:
+        return 0
+    return index / total
+
+
+@persistent
+def on_load_pre(*args):
+    # loading a file removes the modal runner without stopping it
+    end()
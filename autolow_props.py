@@ -1,3 +1,4 @@
+import bpy
 from bpy.types import PropertyGroup
 from bpy.props import (
     EnumProperty,
@@ -5,7 +6,30 @@ from bpy.props import (
     FloatProperty,
     BoolProperty,
     StringProperty,
+    PointerProperty,
 )
+import math
+
+
+REMESHERS = [
+    ("VOXEL", "Voxel", "Use the voxel remesher"),
+    ("QUAD", "Quad", "Use the quad remesher"),
+    ("DECIMATE", "Decimate", "Apply a decimate modifier"),
+    ("NONE", "None", ""),
+]
+
+RESOLUTIONS = [
+    ("256", "256 px", ""),
+    ("512", "512 px", ""),
+    ("1024", "1024 px", ""),
+    ("2048", "2048 px", ""),
+    ("4096", "4096 px", ""),
+    ("8192", "8192 px", ""),
+    ("16384", "16384 px", ""),
+]
+
+# settings a queue item can override
+OVERRIDE_FIELDS = ("remesher", "remesh_percent", "resolution")
 
 
 class AUTOLOW_PG_properties(PropertyGroup):
@@ -36,13 +60,54 @@ class AUTOLOW_PG_properties(PropertyGroup):
     remesher: EnumProperty(
         name="",
         description="Remesher",
+        items=REMESHERS,
+    )
+    remesh_target: EnumProperty(
+        name="",
+        description="What the remesh is aimed at",
         items=[
-            ("VOXEL", "Voxel", "Use the voxel remesher"),
-            ("QUAD", "Quad", "Use the quad remesher"),
-            ("DECIMATE", "Decimate", "Apply a decimate modifier"),
-            ("NONE", "None", ""),
+            ("PERCENT", "Percent", "Remesh to a percentage of the detail"),
+            (
+                "TRIANGLES",
+                "Triangles",
+                "Search the remesh setting that comes closest to a triangle budget",
+            ),
+            (
+                "ERROR",
+                "Error",
+                "Search the lowest poly remesh that stays within a distance"
+                " of the high poly",
+            ),
         ],
     )
+    target_triangles: IntProperty(
+        name="",
+        default=5000,
+        min=4,
+        description="Number of triangles the remeshed object should have at most",
+    )
+    target_error: FloatProperty(
+        name="",
+        default=0.01,
+        min=0.0001,
+        precision=4,
+        subtype="DISTANCE",
+        unit="LENGTH",
+        description=(
+            "Largest distance between the remeshed object and the high poly,"
+            " estimated from sampled vertices"
+        ),
+    )
+    max_trials: IntProperty(
+        name="",
+        default=6,
+        min=1,
+        max=20,
+        description=(
+            "Most trial remeshes used to search the setting. "
+            "More trials get closer to the target"
+        ),
+    )
     remesh_percent: IntProperty(
         name="%",
         default=15,
@@ -53,16 +118,83 @@ class AUTOLOW_PG_properties(PropertyGroup):
             "A lower percent will result in a lower poly mesh"
         ),
     )
+    voxel_estimate: EnumProperty(
+        name="",
+        description="How the voxel size is estimated from the edge lengths",
+        items=[
+            ("MEAN", "Mean", "Average length of all edges"),
+            ("MEDIAN", "Median", "Median length of all edges"),
+            (
+                "TRIMMED",
+                "Trimmed Mean",
+                "Average length of all edges, ignoring the shortest and longest 10%."
+                " This works well on noisy scans",
+            ),
+            (
+                "SAMPLED",
+                "Sampled",
+                "Average length of evenly spaced edges",
+            ),
+        ],
+    )
     samples: IntProperty(
         name="",
-        default=10,
-        max=50,
+        default=1000,
+        max=1000000,
         min=5,
         description=(
-            "More samples will give a better estimation of the voxel size. "
-            "This is usually unnecessary"
+            "Number of evenly spaced edges used to estimate the voxel size."
+            " More samples will give a better estimation"
+        ),
+    )
+
+    detail_method: EnumProperty(
+        name="",
+        description="How the remeshed object is fitted to the high poly",
+        items=[
+            (
+                "MULTIRES",
+                "Multires",
+                "Subdivide a multires modifier and shrinkwrap it to the high poly."
+                " Normals are baked from the multires levels",
+            ),
+            (
+                "PROJECT",
+                "Project",
+                "Project the vertices directly onto the high poly."
+                " Normals are always transferred from the high poly,"
+                " also with active baking",
+            ),
+        ],
+    )
+    detail_level: IntProperty(
+        name="",
+        default=3,
+        max=6,
+        min=0,
+        description=(
+            "Number of multires subdivisions. "
+            "Every level has 4 times the faces of the previous one"
+        ),
+    )
+
+    lod_count: IntProperty(
+        name="",
+        default=0,
+        min=0,
+        max=8,
+        description=(
+            "Number of extra levels of detail. "
+            "Every level is decimated from the previous one and shares its bake"
         ),
     )
+    lod_ratio: FloatProperty(
+        name="",
+        default=0.5,
+        min=0.05,
+        max=0.95,
+        description="Ratio of triangles every level keeps from the previous one",
+    )
 
     # UV properties
 
@@ -71,9 +203,33 @@ class AUTOLOW_PG_properties(PropertyGroup):
         description="UV Unwrap Method",
         items=[
             ("SMART", "Smart UV Project", "Use smart UV project to unwrap mesh"),
+            (
+                "SEAMS",
+                "Angle Seams",
+                "Mark seams on sharp edges and unwrap. Faster on dense meshes",
+            ),
             ("NONE", "None", ""),
         ],
     )
+    seam_angle: FloatProperty(
+        name="",
+        default=math.radians(60),
+        min=0,
+        max=math.pi,
+        subtype="ANGLE",
+        description="Edges sharper than this angle are marked as seams",
+    )
+    uv_padding: IntProperty(
+        name="",
+        default=16,
+        min=0,
+        max=256,
+        subtype="PIXEL",
+        description=(
+            "Space between UV islands in pixels of the bake resolution."
+            " The margin is scaled with the resolution"
+        ),
+    )
 
     # baking properties
 
@@ -90,6 +246,27 @@ class AUTOLOW_PG_properties(PropertyGroup):
             ("NONE", "None", ""),
         ],
     )
+    is_atlas_bake: BoolProperty(
+        name="Atlas",
+        default=False,
+        description=(
+            "Pack the UVs of all queued objects into one layout"
+            " and bake them into one material"
+        ),
+    )
+    bake_engine: EnumProperty(
+        name="",
+        description="Bake Engine",
+        items=[
+            ("CYCLES", "Cycles", "Bake every map with a separate cycles bake"),
+            (
+                "HITBUFFER",
+                "Shared Rays",
+                "Trace the high poly once and derive every map from the same rays."
+                " Only used for transfer baking",
+            ),
+        ],
+    )
     cage_settings: EnumProperty(
         name="",
         description="Cage Settings",
@@ -116,15 +293,61 @@ class AUTOLOW_PG_properties(PropertyGroup):
     resolution: EnumProperty(
         name="",
         description="Image resolution",
+        items=RESOLUTIONS,
+        default=3,
+    )
+    sample_mode: EnumProperty(
+        name="",
+        description="Cycles samples used for baking",
+        items=[
+            (
+                "AUTO",
+                "Auto",
+                "Use the samples each map needs. Noisy maps are baked in batches"
+                " until they stop changing",
+            ),
+            ("SCENE", "Scene", "Use the render samples of the scene"),
+        ],
+    )
+    max_samples: IntProperty(
+        name="Max Samples",
+        default=256,
+        min=1,
+        max=16384,
+        description="Maximum number of samples for noisy maps like AO",
+    )
+    noise_threshold: FloatProperty(
+        name="Noise Threshold",
+        default=0.005,
+        min=0.0001,
+        max=0.1,
+        precision=4,
+        description=(
+            "Stop adding samples when no part of the map changes more than this"
+        ),
+    )
+    is_tiled_bake: BoolProperty(
+        name="Tiled",
+        description=(
+            "Bake in bands of rows that are written to disk one at a time,"
+            " so large images never have to fit in memory."
+            " Maps that can only be baked with cycles are baked at full size."
+            " Maps are streamed as PNG, EXR normals are saved as 16 bit PNG,"
+            " and height maps are scaled by the cage extrusion"
+            " instead of the largest height"
+        ),
+        default=False,
+    )
+    tile_size: EnumProperty(
+        name="",
+        description="Number of rows baked at a time",
         items=[
             ("256", "256 px", ""),
             ("512", "512 px", ""),
             ("1024", "1024 px", ""),
             ("2048", "2048 px", ""),
-            ("4096", "4096 px", ""),
-            ("8192", "8192 px", ""),
         ],
-        default=3,
+        default=2,
     )
 
     # maps properties
@@ -135,6 +358,41 @@ class AUTOLOW_PG_properties(PropertyGroup):
     is_diffuse_bake_on: BoolProperty(
         name="Diffuse", description="Bake diffuse map", default=True
     )
+    is_ao_bake_on: BoolProperty(
+        name="AO", description="Bake ambient occlusion map", default=False
+    )
+    is_roughness_bake_on: BoolProperty(
+        name="Roughness", description="Bake roughness map", default=False
+    )
+    is_metallic_bake_on: BoolProperty(
+        name="Metallic",
+        description="Bake metallic map. This map is made without cycles",
+        default=False,
+    )
+    is_curvature_bake_on: BoolProperty(
+        name="Curvature",
+        description=(
+            "Bake curvature map from the high poly mesh."
+            " This map is made without cycles"
+        ),
+        default=False,
+    )
+    is_height_bake_on: BoolProperty(
+        name="Height",
+        description=(
+            "Bake the distance between the high and low poly."
+            " This map is made without cycles"
+        ),
+        default=False,
+    )
+    is_id_bake_on: BoolProperty(
+        name="ID",
+        description=(
+            "Bake a flat color for every material of the high poly."
+            " This map is made without cycles"
+        ),
+        default=False,
+    )
 
     # settings properties
 
@@ -146,6 +404,52 @@ class AUTOLOW_PG_properties(PropertyGroup):
         description="Images will be saved at this path.",
         default=".\\Autolow\\",
     )
+    use_async_save: BoolProperty(
+        name="Background Saving",
+        default=True,
+        description=(
+            "Encode and write images on background threads" " while the next bake runs"
+        ),
+    )
+    png_compression: IntProperty(
+        name="Compression",
+        default=6,
+        min=0,
+        max=9,
+        description=(
+            "PNG compression level of background saving and tiled baking."
+            " Lower levels save faster but make bigger files"
+        ),
+    )
+    use_16_bit: BoolProperty(
+        name="16 Bit",
+        default=False,
+        description=(
+            "Bake non-color maps to float images and save them as 16 bit PNGs."
+            " Only used with background saving"
+        ),
+    )
+    use_exr_normals: BoolProperty(
+        name="EXR Normals",
+        default=False,
+        description="Bake normal maps to float images and save them as OpenEXR",
+    )
+    export_format: EnumProperty(
+        name="Format",
+        description="Export every lowpoly with its baked material after it finishes",
+        items=[
+            ("NONE", "None", "Don't export"),
+            ("GLTF", "glTF", "Binary glTF with the images inside"),
+            ("FBX", "FBX", "FBX with the images inside"),
+            ("OBJ", "OBJ", "OBJ and MTL next to the saved images"),
+        ],
+    )
+    export_path: StringProperty(
+        name="Path",
+        description="Folder the lowpolys are exported to, one file for each object",
+        default="//export/",
+        subtype="DIR_PATH",
+    )
     autosave: BoolProperty(
         name="",
         description=(
@@ -164,6 +468,153 @@ class AUTOLOW_PG_properties(PropertyGroup):
         default=False,
     )
 
+    # stats properties
+
+    is_stats_exported: BoolProperty(
+        name="",
+        description="Export the time and memory used by every stage after a run",
+        default=False,
+    )
+    stats_path: StringProperty(
+        name="Path",
+        description=(
+            "File or folder the stats are exported to."
+            " Folders get a file called 'autolow_stats'"
+        ),
+        default="//",
+        subtype="FILE_PATH",
+    )
+    stats_format: EnumProperty(
+        name="",
+        description="Stats file format",
+        items=[
+            ("JSON", "JSON", ""),
+            ("CSV", "CSV", ""),
+        ],
+    )
+
+    # cache properties
+
+    use_cache: BoolProperty(
+        name="",
+        description=(
+            "Reuse remesh and bake results of meshes that were already processed"
+            " with the same settings. Only maps that are saved to disk are cached"
+        ),
+        default=False,
+    )
+    cache_path: StringProperty(
+        name="Path",
+        description=(
+            "Folder where results are cached."
+            " If empty, the system's temporary folder is used"
+        ),
+        default="",
+        subtype="DIR_PATH",
+    )
+    cache_size: IntProperty(
+        name="Size (MB)",
+        default=2048,
+        min=16,
+        description=(
+            "Maximum size of the cache."
+            " The least recently used results are removed when it's full"
+        ),
+    )
+
+    # parallel properties
+
+    max_minutes: FloatProperty(
+        name="Max Minutes",
+        default=0,
+        min=0,
+        description=(
+            "Objects estimated to take longer are not processed right away."
+            " 0 turns the limit off"
+        ),
+    )
+    max_memory: IntProperty(
+        name="Max Memory",
+        default=0,
+        min=0,
+        subtype="NONE",
+        description=(
+            "Objects estimated to need more memory in MB are not processed"
+            " right away. 0 turns the limit off"
+        ),
+    )
+    limit_action: EnumProperty(
+        name="Over Limit",
+        description="What happens to objects over the limits",
+        items=[
+            ("SKIP", "Skip", "Leave the objects in the queue without processing"),
+            ("LAST", "Run Last", "Process the objects after all others"),
+        ],
+    )
+    use_duplicates: BoolProperty(
+        name="Reuse Duplicates",
+        default=True,
+        description=(
+            "Process queued objects with the same mesh, scale, materials and"
+            " settings once. The others get lowpolys that share its mesh and"
+            " material"
+        ),
+    )
+    worker_count: IntProperty(
+        name="Workers",
+        default=1,
+        max=64,
+        min=1,
+        description=(
+            "Number of background blender processes used to process the queue."
+            " Each worker processes a part of the queue"
+        ),
+    )
+    threads_per_worker: IntProperty(
+        name="Threads",
+        default=0,
+        max=256,
+        min=0,
+        description=(
+            "Number of threads each worker may use."
+            " 0 will split the available cores evenly between workers"
+        ),
+    )
+    use_core_affinity: BoolProperty(
+        name="Core Affinity",
+        description="Pin each worker to its own set of cores (Linux only)",
+        default=False,
+    )
+
+
+def update_overrides(self, context):
+    # overrides start from the current settings
+    if self.use_overrides:
+        props = context.scene.autolow_props
+        for field in OVERRIDE_FIELDS:
+            setattr(self, field, getattr(props, field))
+
 
 class AUTOLOW_PG_queue_properties(PropertyGroup):
     obj_id: IntProperty()
+    # the object is referenced, so renaming it doesn't break the queue
+    obj: PointerProperty(
+        type=bpy.types.Object, poll=lambda self, obj: obj.type == "MESH"
+    )
+    use_overrides: BoolProperty(
+        name="Override Settings",
+        description="Process this object with its own remesh and bake settings",
+        default=False,
+        update=update_overrides,
+    )
+    remesher: EnumProperty(name="Remesher", items=REMESHERS)
+    remesh_percent: IntProperty(name="%", default=15, max=100, min=1)
+    resolution: EnumProperty(name="Resolution", items=RESOLUTIONS, default=3)
+    # pre-flight estimate, 0 until estimated
+    est_seconds: FloatProperty()
+    est_memory: FloatProperty()
+    # estimated time and memory of every stage, separated by ";"
+    est_stages: StringProperty()
+    rejected: StringProperty()
+    # step of the current run, "Done" once the object finished
+    status: StringProperty()
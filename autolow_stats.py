@@ -0,0 +1,174 @@
+import bpy
+import csv
+import json
+import os
+import pathlib
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+# per stage timing and memory instrumentation
+
+FIELDS = (
+    "object",
+    "stage",
+    "seconds",
+    "peak_rss_mb",
+    "verts_in",
+    "faces_in",
+    "verts_out",
+    "faces_out",
+    "samples",
+    "triangles",
+    "error",
+    "uv_coverage",
+)
+
+# records of the last run
+records = []
+current_object = ""
+
+
+def reset():
+    global current_object
+    records.clear()
+    current_object = ""
+
+
+def begin_object(name):
+    global current_object
+    current_object = name
+
+
+def get_object_records(name):
+    return [record for record in records if record["object"] == name]
+
+
+@contextmanager
+def stage(name, obj=None):
+    # the record is yielded so stages can add their own fields
+    verts_in, faces_in = get_mesh_size(obj)
+    record = {
+        "object": current_object,
+        "stage": name,
+        "samples": "",
+        "triangles": "",
+        "error": "",
+        "uv_coverage": "",
+    }
+    sampler = RSSSampler()
+    sampler.start()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        seconds = time.perf_counter() - start
+        sampler.stop()
+        verts_out, faces_out = get_mesh_size(obj)
+        record.update(
+            {
+                "seconds": round(seconds, 4),
+                "peak_rss_mb": round(sampler.peak / (1024 * 1024), 1),
+                "verts_in": verts_in,
+                "faces_in": faces_in,
+                "verts_out": verts_out,
+                "faces_out": faces_out,
+            }
+        )
+        records.append(record)
+
+
+def get_mesh_size(obj):
+    try:
+        mesh = obj.data
+        return len(mesh.vertices), len(mesh.polygons)
+    except (AttributeError, ReferenceError):
+        # no object or the object was removed during the stage
+        return 0, 0
+
+
+class RSSSampler:
+    # polls the resident set size on a thread to find the peak of a stage
+    interval = 0.05
+
+    def __init__(self):
+        self.peak = get_rss()
+        self.event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.event.set()
+        self.thread.join()
+        self.peak = max(self.peak, get_rss())
+
+    def run(self):
+        while not self.event.wait(self.interval):
+            self.peak = max(self.peak, get_rss())
+
+
+def get_rss():
+    # current resident set size in bytes
+    if sys.platform.startswith("linux"):
+        try:
+            with open("/proc/self/statm") as file:
+                return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError):
+            return 0
+
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(
+            process, ctypes.byref(counters), counters.cb
+        ):
+            return counters.WorkingSetSize
+        return 0
+
+    # other platforms only report the peak of the whole process
+    try:
+        import resource
+
+        # ru_maxrss is in bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:
+        return 0
+
+
+def export(path, file_format="JSON"):
+    path = pathlib.Path(bpy.path.abspath(path))
+    if path.is_dir():
+        path = path / ("autolow_stats." + file_format.lower())
+
+    if file_format == "CSV":
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(records)
+    else:
+        with open(path, "w") as file:
+            json.dump(records, file, indent=2)
+
+    return path
@@ -1,6 +1,8 @@
 import bpy
 from bpy.types import Panel
 from .autolow_op import get_props
+from . import autolow_stats as stats
+from . import autolow_progress as progress
 
 
 class AUTOLOW_PT_main(Panel):
@@ -10,9 +12,27 @@ class AUTOLOW_PT_main(Panel):
     bl_category = "AutoLow"
 
     def draw(self, context):
-        row = self.layout.row()
+        layout = self.layout
+        row = layout.row()
         row.scale_y = 2
-        row.operator("autolow.start", text="Start")
+        if not progress.is_running:
+            row.operator("autolow.start", text="Start")
+            return
+
+        row.operator("autolow.cancel", icon="CANCEL")
+        col = layout.column(align=True)
+        col.label(
+            text="Object "
+            + str(min(progress.index + 1, progress.total))
+            + " of "
+            + str(progress.total)
+            + ", "
+            + format(progress.get_factor() * 100, ".0f")
+            + "%"
+        )
+        if progress.current_object:
+            col.label(text=progress.current_object + ": " + progress.current_step)
+        col.label(text=format(progress.get_elapsed() / 60, ".1f") + " min elapsed")
 
 
 class AUTOLOW_PT_workflow(Panel):
@@ -45,16 +65,55 @@ class AUTOLOW_PT_remesh(Panel):
         row.label(text="Remesher")
         row.prop(props, "remesher")
 
-        row = layout.row()
+        if remesher != "NONE":
+            row = layout.row()
+            row.label(text="Target")
+            row.prop(props, "remesh_target")
+
+            row = layout.row()
+            if props.remesh_target == "TRIANGLES":
+                row.label(text="Triangles")
+                row.prop(props, "target_triangles")
+            elif props.remesh_target == "ERROR":
+                row.label(text="Max Error")
+                row.prop(props, "target_error")
+            else:
+                row.label(text="Percent")
+                row.prop(props, "remesh_percent", slider=True)
+
+            if props.remesh_target != "PERCENT":
+                row = layout.row()
+                row.label(text="Max Trials")
+                row.prop(props, "max_trials")
 
         if remesher != "NONE":
-            row.label(text="Percent")
-            row.prop(props, "remesh_percent", slider=True)
+            row = layout.row()
+            row.label(text="Detail")
+            row.prop(props, "detail_method")
+
+            if props.detail_method == "MULTIRES":
+                row = layout.row()
+                row.label(text="Levels")
+                row.prop(props, "detail_level")
 
         if remesher == "VOXEL":
             row = layout.row()
-            row.label(text="Samples")
-            row.prop(props, "samples", slider=True)
+            row.label(text="Estimate")
+            row.prop(props, "voxel_estimate")
+
+            if props.voxel_estimate == "SAMPLED":
+                row = layout.row()
+                row.label(text="Samples")
+                row.prop(props, "samples")
+
+        row = layout.row()
+        row.label(text="LODs")
+        row.prop(props, "lod_count")
+
+        if props.lod_count > 0:
+            row = layout.row()
+            row.label(text="LOD Ratio")
+            row.prop(props, "lod_ratio", slider=True)
 
 
 class AUTOLOW_PT_uv_unwrap(Panel):
@@ -72,6 +131,17 @@ class AUTOLOW_PT_uv_unwrap(Panel):
         row.label(text="Method")
         row.prop(props, "unwrap_method")
 
+        if props.unwrap_method == "SEAMS":
+            row = layout.row()
+            row.label(text="Seam Angle")
+            row.prop(props, "seam_angle")
+
+        row = layout.row()
+        row.label(text="Padding")
+        row.prop(props, "uv_padding")
+
+        layout.operator("autolow.pack_atlas")
+
 
 class AUTOLOW_PT_baking(Panel):
     bl_label = "Baking"
@@ -91,6 +161,16 @@ class AUTOLOW_PT_baking(Panel):
         row.prop(props, "bake_method")
 
         if bake_method != "NONE":
+            row = layout.row()
+            row.label(text="Engine")
+            row.prop(props, "bake_engine")
+            if bake_method != "TRANSFER":
+                row.active = False
+
+            row = layout.row()
+            row.label(text="Queue")
+            row.prop(props, "is_atlas_bake")
+
             row = layout.row()
             row.prop(props, "cage_settings", text=" ", expand=True)
 
@@ -120,12 +200,32 @@ class AUTOLOW_PT_maps(Panel):
         row.label(text="Resolution")
         row.prop(props, "resolution")
 
-        row = layout.row(align=True)
-        row.prop(props, "is_normal_bake_on")
-        row.prop(props, "is_diffuse_bake_on")
+        row = layout.row()
+        row.label(text="Samples")
+        row.prop(props, "sample_mode")
+        if props.sample_mode == "AUTO":
+            col = layout.column(align=True)
+            col.prop(props, "max_samples")
+            col.prop(props, "noise_threshold")
+
+        row = layout.row()
+        row.prop(props, "is_tiled_bake")
+        sub = row.row()
+        sub.prop(props, "tile_size")
+        if not props.is_tiled_bake:
+            sub.active = False
+
+        grid = layout.grid_flow(columns=2, even_columns=True, align=True)
+        grid.prop(props, "is_normal_bake_on")
+        grid.prop(props, "is_diffuse_bake_on")
+        grid.prop(props, "is_ao_bake_on")
+        grid.prop(props, "is_roughness_bake_on")
+        grid.prop(props, "is_metallic_bake_on")
+        grid.prop(props, "is_curvature_bake_on")
+        grid.prop(props, "is_height_bake_on")
+        grid.prop(props, "is_id_bake_on")
         if bake_method == "NONE":
-            row.active = False
-            row.active = False
+            grid.active = False
 
 
 class AUTOLOW_PT_settings(Panel):
@@ -166,6 +266,32 @@ class AUTOLOW_PT_save_image(Panel):
         if not is_image_saved:
             row.active = False
 
+        col = layout.column()
+        col.prop(props, "use_async_save")
+        col.prop(props, "png_compression", slider=True)
+        col.prop(props, "use_16_bit")
+        col.prop(props, "use_exr_normals")
+        if not is_image_saved:
+            col.active = False
+
+
+class AUTOLOW_PT_export(Panel):
+    bl_label = "Export"
+    bl_space_type = "VIEW_3D"
+    bl_region_type = "UI"
+    bl_parent_id = "AUTOLOW_PT_settings"
+    bl_options = {"DEFAULT_CLOSED"}
+
+    def draw(self, context):
+        layout = self.layout
+        props = get_props()
+
+        layout.prop(props, "export_format")
+        row = layout.row()
+        row.prop(props, "export_path")
+        if props.export_format == "NONE":
+            row.active = False
+
 
 class AUTOLOW_PT_autosave(Panel):
     bl_label = "Autosave"
@@ -188,6 +314,136 @@ class AUTOLOW_PT_autosave(Panel):
             row.active = False
 
 
+class AUTOLOW_PT_stats(Panel):
+    bl_label = "Stats"
+    bl_space_type = "VIEW_3D"
+    bl_region_type = "UI"
+    bl_category = "AutoLow"
+    bl_parent_id = "AUTOLOW_PT_main"
+    bl_options = {"DEFAULT_CLOSED"}
+
+    def draw(self, context):
+        layout = self.layout
+
+        if not stats.records:
+            layout.label(text="No stats yet")
+            return
+
+        # one box per object with a row per stage
+        names = []
+        for record in stats.records:
+            if record["object"] not in names:
+                names.append(record["object"])
+
+        for name in names:
+            box = layout.box()
+            object_records = stats.get_object_records(name)
+            total = sum(record["seconds"] for record in object_records)
+            box.label(text=name + " (" + format(total, ".2f") + " s)")
+            col = box.column(align=True)
+            for record in object_records:
+                row = col.row()
+                row.label(text=record["stage"])
+                row.label(text=format(record["seconds"], ".2f") + " s")
+                row.label(text=format(record["peak_rss_mb"], ".0f") + " MB")
+                if record.get("samples") != "":
+                    row.label(text=str(record.get("samples")) + " spp")
+                if record.get("uv_coverage", "") != "":
+                    row.label(text=format(record["uv_coverage"] * 100, ".0f") + "% uv")
+                if record.get("error", "") != "":
+                    row.label(text=str(record["triangles"]) + " tris")
+                    row.label(text="error " + format(record["error"], ".4g"))
+                row.label(
+                    text=str(record["faces_in"]) + " > " + str(record["faces_out"])
+                )
+
+
+class AUTOLOW_PT_export_stats(Panel):
+    bl_label = "Export Stats"
+    bl_space_type = "VIEW_3D"
+    bl_region_type = "UI"
+    bl_parent_id = "AUTOLOW_PT_settings"
+    bl_options = {"DEFAULT_CLOSED"}
+
+    def draw_header(self, context):
+        self.layout.prop(get_props(), "is_stats_exported", text="")
+
+    def draw(self, context):
+        layout = self.layout
+        props = get_props()
+
+        col = layout.column()
+        col.prop(props, "stats_path")
+        row = col.row()
+        row.label(text="Format")
+        row.prop(props, "stats_format")
+        if not props.is_stats_exported:
+            col.active = False
+
+
+class AUTOLOW_PT_cache(Panel):
+    bl_label = "Cache"
+    bl_space_type = "VIEW_3D"
+    bl_region_type = "UI"
+    bl_parent_id = "AUTOLOW_PT_settings"
+    bl_options = {"DEFAULT_CLOSED"}
+
+    def draw_header(self, context):
+        self.layout.prop(get_props(), "use_cache", text="")
+
+    def draw(self, context):
+        layout = self.layout
+        props = get_props()
+
+        col = layout.column()
+        col.prop(props, "cache_path")
+        col.prop(props, "cache_size")
+        if not props.use_cache:
+            col.active = False
+
+
+class AUTOLOW_PT_limits(Panel):
+    bl_label = "Limits"
+    bl_space_type = "VIEW_3D"
+    bl_region_type = "UI"
+    bl_parent_id = "AUTOLOW_PT_settings"
+    bl_options = {"DEFAULT_CLOSED"}
+
+    def draw(self, context):
+        layout = self.layout
+        props = get_props()
+
+        col = layout.column()
+        col.prop(props, "max_minutes")
+        col.prop(props, "max_memory")
+
+        row = layout.row()
+        row.prop(props, "limit_action", expand=True)
+        if props.max_minutes == 0 and props.max_memory == 0:
+            row.active = False
+
+
+class AUTOLOW_PT_parallel(Panel):
+    bl_label = "Parallel"
+    bl_space_type = "VIEW_3D"
+    bl_region_type = "UI"
+    bl_parent_id = "AUTOLOW_PT_settings"
+    bl_options = {"DEFAULT_CLOSED"}
+
+    def draw(self, context):
+        layout = self.layout
+        props = get_props()
+
+        row = layout.row()
+        row.prop(props, "worker_count")
+
+        col = layout.column()
+        col.prop(props, "threads_per_worker")
+        col.prop(props, "use_core_affinity")
+        if props.worker_count == 1:
+            col.active = False
+
+
 class AUTOLOW_PT_queue(Panel):
     bl_label = "Queue"
     bl_space_type = "VIEW_3D"
@@ -212,9 +468,51 @@ class AUTOLOW_PT_queue(Panel):
         col.operator("queue.actions", icon="TRIA_UP", text="").action = "UP"
         col.operator("queue.actions", icon="TRIA_DOWN", text="").action = "DOWN"
 
+        row = layout.row()
+        row.operator("autolow.queue_add", icon="ADD")
+        row.operator("autolow.estimate", icon="TIME")
+        layout.prop(get_props(), "use_duplicates")
+
+        # overrides of the active item
+        if 0 <= scene.queue_index < len(scene.queue):
+            item = scene.queue[scene.queue_index]
+            box = layout.box()
+            box.prop(item, "use_overrides")
+            col = box.column()
+            col.prop(item, "remesher")
+            col.prop(item, "remesh_percent")
+            col.prop(item, "resolution")
+            if not item.use_overrides:
+                col.active = False
+
+            # breakdown of the last estimate
+            if item.est_stages:
+                box = layout.box()
+                col = box.column(align=True)
+                for line in item.est_stages.split(";"):
+                    col.label(text=line)
+
 
 class AUTOLOW_UL_queue_items(bpy.types.UIList):
     def draw_item(
         self, context, layout, data, item, icon, active_data, active_propname, index
     ):
-        layout.label(text=item.name)
+        if item.obj is not None:
+            layout.label(text=item.obj.name)
+        else:
+            layout.label(text=item.name, icon="ERROR")
+        if item.use_overrides:
+            layout.label(text="", icon="MODIFIER")
+        if item.status == "Done":
+            layout.label(text="", icon="CHECKMARK")
+        elif item.status:
+            layout.label(text=item.status, icon="TIME")
+        elif item.rejected:
+            layout.label(text=item.rejected, icon="ERROR")
+        elif item.est_seconds > 0:
+            layout.label(
+                text=format(item.est_seconds / 60, ".1f")
+                + " min, "
+                + format(item.est_memory, ".0f")
+                + " MB"
+            )
@@ -1,37 +1,193 @@
+import bmesh
 import bpy
-import math
+import numpy as np
 import pathlib
+from contextlib import contextmanager
+from . import autolow_stats as stats
+from . import autolow_image_io as image_io
 
 
-# utility functions
+# samples that are enough for each bake type without direct and indirect light
+BASE_SAMPLES = {"NORMAL": 1, "DIFFUSE": 1, "ROUGHNESS": 1, "AO": 16}
+# bake types that are noisy and get more samples until they converge
+NOISY_BAKE_TYPES = {"AO"}
 
 
-def calc_avg_voxel_size(obj):
-    samples = get_props().samples
+# utility functions
 
-    obj_mesh = obj.data
-    obj_vertices = obj_mesh.vertices
-    obj_edges = obj_mesh.edges
 
-    edge_count = len(obj_edges)
-    edge_sum = 0.0
+class AutolowError(Exception):
+    pass
 
-    # how many edges will be used to calculate average
-    accuracy_count = samples
 
-    for interval in range(accuracy_count):
-        # get edge number at spaced out intervals for better estimation
-        edge_number = int(edge_count * interval / accuracy_count)
-        # get vertex numbers of chosen edge
-        vert1 = obj_edges[edge_number].vertices[0]
-        vert2 = obj_edges[edge_number].vertices[1]
-        # calculate distance between vertices to get edge length
-        edge_sum += math.dist(obj_vertices[vert1].co, obj_vertices[vert2].co)
+def check_object(obj):
+    # return an error message if the object can't be processed
+    if not obj:
+        return "No object selected"
+    if obj.type != "MESH":
+        return "Object must be a mesh"
+    if len(obj.data.polygons) == 0:
+        return "The mesh must have more than 0 polygons"
+    return None
 
-    # calculate average
-    avg_voxel_size = edge_sum / accuracy_count
 
-    return avg_voxel_size
+def calc_avg_voxel_size(obj):
+    props = get_props()
+    estimate = props.voxel_estimate
+
+    if estimate == "SAMPLED":
+        # average of evenly spaced edges
+        edge_lengths = get_edge_lengths(obj.data, props.samples)
+        return float(np.mean(edge_lengths))
+
+    edge_lengths = get_edge_lengths(obj.data)
+    if estimate == "MEDIAN":
+        return float(np.median(edge_lengths))
+    if estimate == "TRIMMED":
+        # ignore the shortest and longest 10% of edges
+        edge_lengths = np.sort(edge_lengths)
+        trim = int(len(edge_lengths) * 0.1)
+        if trim > 0:
+            edge_lengths = edge_lengths[trim:-trim]
+    return float(np.mean(edge_lengths))
+
+
+def get_edge_lengths(mesh, samples=None):
+    # bulk read vertex positions and edge indices
+    coords = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", coords)
+    coords.shape = (-1, 3)
+    edges = np.empty(len(mesh.edges) * 2, dtype=np.int32)
+    mesh.edges.foreach_get("vertices", edges)
+    edges.shape = (-1, 2)
+
+    if samples is not None and samples < len(edges):
+        # evenly spaced edges, so the same mesh always gets the same voxel size
+        edges = edges[np.linspace(0, len(edges) - 1, samples).astype(np.int64)]
+
+    return np.linalg.norm(coords[edges[:, 0]] - coords[edges[:, 1]], axis=1)
+
+
+def check_topology(mesh):
+    # counts of the problems that make quadriflow fail, read in bulk
+    edges = np.empty(len(mesh.edges) * 2, dtype=np.int32)
+    mesh.edges.foreach_get("vertices", edges)
+    edges.shape = (-1, 2)
+    loop_edges = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get("edge_index", loop_edges)
+    loop_verts = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get("vertex_index", loop_verts)
+
+    face_counts = np.bincount(loop_edges, minlength=len(edges))
+    # the two faces of an edge run along it in opposite directions,
+    # unless their normals are flipped against each other
+    directions = np.where(loop_verts == edges[loop_edges, 0], 1, -1)
+    balance = np.bincount(loop_edges, weights=directions, minlength=len(edges))
+    vertex_edges = np.bincount(edges.ravel(), minlength=len(mesh.vertices))
+
+    return {
+        "edges": len(edges),
+        "boundary_edges": int(np.count_nonzero(face_counts == 1)),
+        "non_manifold_edges": int(np.count_nonzero(face_counts > 2)),
+        "flipped_edges": int(np.count_nonzero((face_counts == 2) & (balance != 0))),
+        "loose_edges": int(np.count_nonzero(face_counts == 0)),
+        "loose_verts": int(np.count_nonzero(vertex_edges == 0)),
+    }
+
+
+def get_uv_margin():
+    # padding in pixels of the bake resolution as a fraction of the uv square
+    props = get_props()
+    return props.uv_padding / int(props.resolution)
+
+
+def mark_seams(mesh, angle):
+    # seams on edges sharper than the angle and on open edges
+    normals = np.empty(len(mesh.polygons) * 3, dtype=np.float32)
+    mesh.polygons.foreach_get("normal", normals)
+    normals.shape = (-1, 3)
+    loop_totals = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("loop_total", loop_totals)
+    loop_edges = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get("edge_index", loop_edges)
+
+    # loops are stored in polygon order
+    loop_faces = np.repeat(np.arange(len(loop_totals)), loop_totals)
+    counts = np.bincount(loop_edges, minlength=len(mesh.edges))
+    order = np.argsort(loop_edges, kind="stable")
+    starts = np.cumsum(counts) - counts
+
+    seams = counts != 2
+    shared = np.flatnonzero(counts == 2)
+    first = loop_faces[order[starts[shared]]]
+    second = loop_faces[order[starts[shared] + 1]]
+    cosines = (normals[first] * normals[second]).sum(axis=1)
+    seams[shared] = cosines < np.cos(angle)
+
+    mesh.edges.foreach_set("use_seam", seams)
+    return int(np.count_nonzero(seams))
+
+
+def calc_uv_coverage(mesh):
+    # fraction of the uv square covered by faces, overlaps count twice
+    uv_layer = mesh.uv_layers.active
+    if uv_layer is None:
+        return 0.0
+    mesh.calc_loop_triangles()
+    tris = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get("loops", tris)
+    uvs = np.empty(len(uv_layer.data) * 2, dtype=np.float32)
+    uv_layer.data.foreach_get("uv", uvs)
+
+    corners = uvs.reshape(-1, 2)[tris.reshape(-1, 3)]
+    a = corners[:, 1] - corners[:, 0]
+    b = corners[:, 2] - corners[:, 0]
+    return float(np.abs(a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]).sum() / 2)
+
+
+@contextmanager
+def view_layer_selection(objects):
+    # some operators read the selection and the active object of the view layer
+    # instead of the context, so they are swapped to the objects while they run
+    view_layer_objects = bpy.context.view_layer.objects
+    selected = [obj for obj in view_layer_objects if obj.select_get()]
+    active = view_layer_objects.active
+    for obj in selected:
+        obj.select_set(False)
+    for obj in objects:
+        obj.select_set(True)
+    view_layer_objects.active = objects[0]
+    try:
+        yield
+    finally:
+        for obj in objects:
+            obj.select_set(False)
+        for obj in selected:
+            obj.select_set(True)
+        view_layer_objects.active = active
+
+
+@contextmanager
+def edit_mode(objects):
+    # edit mode is entered for every selected object of the view layer
+    active, others = objects[0], objects[1:]
+    with view_layer_selection(objects):
+        with object_override(active, others):
+            bpy.ops.object.mode_set(mode="EDIT")
+        try:
+            with object_override(active, others, edit_object=active):
+                bpy.ops.mesh.select_all(action="SELECT")
+                yield
+        finally:
+            with object_override(active, others):
+                bpy.ops.object.mode_set(mode="OBJECT")
+
+
+def pack_atlas(objects, margin):
+    # pack the islands of all objects into one shared uv square
+    with edit_mode(objects):
+        bpy.ops.uv.select_all(action="SELECT")
+        bpy.ops.uv.pack_islands(rotate=True, margin=margin)
 
 
 def new_node(nodes, location, name="ShaderNodeTexImage", image=None):
@@ -56,21 +212,116 @@ def new_image(name: str, non_color=False, use_float=False):
     return image
 
 
-def save_image(image):
+def get_unique_image_name(name):
+    # numbered past the images of this file and the files in the image folder,
+    # so no map overwrites one saved by another run or worker
+    folder = pathlib.Path(get_image_dir()) if get_props().is_image_saved else None
+    unique = name
+    number = 0
+    while unique in bpy.data.images or (
+        folder is not None and any(folder.glob(glob_escape(unique) + ".*"))
+    ):
+        number += 1
+        unique = name + "." + str(number).zfill(3)
+    return unique
+
+
+def glob_escape(name):
+    # object names can contain the special characters of glob patterns
+    return "".join("[" + c + "]" if c in "*?[" else c for c in name)
+
+
+def save_image(image, file_format="PNG", bit_depth=8, done=None):
+    # done is called once the image is on disk
     props = get_props()
     is_image_saved = props.is_image_saved
 
     if is_image_saved:
-        path = props.image_path
-        if path == ".\\Autolow\\":
-            # save images in 'AutoLow' folder
-            path = pathlib.Path(bpy.path.abspath("//") + "AutoLow")
-            path.mkdir(exist_ok=True)
-            path = str(path)
-
-        image.filepath_raw = path + "\\" + image.name + ".png"
-        image.file_format = "PNG"
-        image.save()
+        path = get_image_dir()
+        extension = ".exr" if file_format == "OPEN_EXR" else ".png"
+        image.filepath_raw = str(pathlib.Path(path) / (image.name + extension))
+        image.file_format = file_format
+
+        if props.use_async_save and image_io.can_write(file_format):
+            # only copying the pixels blocks, they are encoded on a thread
+            with stats.stage("queue_save_" + image.name):
+                width, height = image.size
+                pixels = np.empty(width * height * 4, dtype=np.float32)
+                image.pixels.foreach_get(pixels)
+                image_io.get_writer().submit(
+                    bpy.path.abspath(image.filepath_raw),
+                    pixels.reshape(height, width, 4),
+                    file_format,
+                    bit_depth,
+                    props.png_compression,
+                    done=lambda: on_image_written(image, done),
+                )
+            return
+
+        with stats.stage("save_" + image.name):
+            image.save()
+    if done is not None:
+        done()
+
+
+def on_image_written(image, done):
+    try:
+        # the generated image is read from the file from now on
+        image.source = "FILE"
+    except ReferenceError:
+        # the image was removed while it was written
+        return
+    if done is not None:
+        done()
+
+
+def flush_images():
+    # wait for the images that are written in the background
+    with stats.stage("flush_images"):
+        return image_io.flush()
+
+
+def get_image_dir():
+    path = get_props().image_path
+    if path == ".\\Autolow\\":
+        # save images in 'AutoLow' folder
+        path = pathlib.Path(bpy.path.abspath("//") + "AutoLow")
+        path.mkdir(exist_ok=True)
+        path = str(path)
+    return path
+
+
+def get_export_dir():
+    path = pathlib.Path(bpy.path.abspath(get_props().export_path))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def export_objects(objects, filepath, file_format):
+    # the exporters only write selected objects
+    active, others = objects[0], objects[1:]
+    try:
+        with view_layer_selection(objects), object_override(active, others):
+            if file_format == "GLTF":
+                bpy.ops.export_scene.gltf(
+                    filepath=filepath, export_format="GLB", use_selection=True
+                )
+            elif file_format == "FBX":
+                bpy.ops.export_scene.fbx(
+                    filepath=filepath,
+                    use_selection=True,
+                    path_mode="COPY",
+                    embed_textures=True,
+                )
+            else:
+                bpy.ops.wm.obj_export(
+                    filepath=filepath,
+                    export_selected_objects=True,
+                    export_materials=True,
+                )
+    except (AttributeError, RuntimeError) as error:
+        # the exporter addon is off or the export failed
+        raise AutolowError("Export failed: " + str(error))
 
 
 def save():
@@ -85,41 +336,202 @@ def save():
     return True
 
 
-def make_cage(lowpoly):
-    # make cage for baking
-    cage = copy_obj(lowpoly)
-    cage.name = "cage"
-    bpy.ops.object.editmode_toggle()
-    bpy.ops.mesh.select_all(action="SELECT")
-    bpy.ops.transform.shrink_fatten(value=2)
-    bpy.ops.object.editmode_toggle()
-    cage.select_set(False)
+def make_cage(lowpoly, offsets):
+    # make cage for baking by moving the lowpoly's vertices along their normals
+    mesh = lowpoly.data.copy()
+    mesh.name = "cage"
+    matrix = np.array(lowpoly.matrix_world, dtype=np.float32)
+    co, normals = get_world_vertices(mesh, matrix)
+    co += normals * offsets[:, None]
+
+    # back to the lowpoly's local space
+    co = (co - matrix[:3, 3]) @ np.linalg.inv(matrix[:3, :3]).T
+    mesh.vertices.foreach_set("co", co.astype(np.float32).ravel())
+    mesh.update()
+
+    cage = bpy.data.objects.new("cage", mesh)
+    cage.matrix_world = lowpoly.matrix_world
+    get_collection(lowpoly).objects.link(cage)
     return cage
 
 
+def calc_cage_offsets(lowpoly, high):
+    # distance every lowpoly vertex has to move out to cover the highpoly
+    # high is the HighpolySurface of the highpoly
+    mesh = lowpoly.data
+    matrix = np.array(lowpoly.matrix_world, dtype=np.float32)
+    co, normals = get_world_vertices(mesh, matrix)
+
+    # base offset scaled to the size of the mesh instead of a fixed distance
+    scale = np.linalg.norm(matrix[:3, :3], axis=0).mean()
+    edge_length = float(np.mean(get_edge_lengths(mesh))) * scale
+    diagonal = float(np.linalg.norm(co.max(axis=0) - co.min(axis=0)))
+    base = max(edge_length * 0.25, diagonal * 0.001)
+    max_offset = max(edge_length * 4, base)
+
+    bvh = high.get()[1]
+    offsets = np.empty(len(co), dtype=np.float32)
+    for i, (position, normal) in enumerate(zip(co.tolist(), normals.tolist())):
+        distance = 0.0
+        # highpoly surface closest to the vertex
+        nearest = bvh.find_nearest(position, max_offset)
+        if nearest[0] is not None:
+            distance = nearest[3]
+        # highpoly surface outside the vertex
+        hit = bvh.ray_cast(position, normal, max_offset)
+        if hit[0] is not None:
+            distance = max(distance, hit[3])
+        offsets[i] = distance
+
+    return np.clip(offsets * 1.25 + base, base, max_offset)
+
+
+def calc_surface_error(low, high, high_bvh, samples=2000):
+    # approximate hausdorff distance between two surfaces from sampled vertices
+    rng = np.random.default_rng(0)
+    low_bvh = low.build_bvh()
+    error = 0.0
+    for points, bvh in ((low.co, high_bvh), (high.co, low_bvh)):
+        if len(points) > samples:
+            points = points[rng.choice(len(points), samples, replace=False)]
+        for point in points.tolist():
+            nearest = bvh.find_nearest(point)
+            if nearest[0] is not None:
+                error = max(error, nearest[3])
+    return error
+
+
+def project_to_surface(lowpoly, high):
+    # move every lowpoly vertex to the closest highpoly surface along its normal
+    mesh = lowpoly.data
+    matrix = np.array(lowpoly.matrix_world, dtype=np.float32)
+    co, normals = get_world_vertices(mesh, matrix)
+
+    # vertices further away than a few edges are left where they are
+    scale = np.linalg.norm(matrix[:3, :3], axis=0).mean()
+    max_dist = float(np.mean(get_edge_lengths(mesh))) * scale * 4
+
+    bvh = high.get()[1]
+    for i, (position, normal) in enumerate(zip(co.tolist(), normals.tolist())):
+        # like a shrinkwrap projection in both directions
+        best = None
+        for direction in (normal, [-n for n in normal]):
+            hit = bvh.ray_cast(position, direction, max_dist)
+            if hit[0] is not None and (best is None or hit[3] < best[3]):
+                best = hit
+        if best is None:
+            best = bvh.find_nearest(position, max_dist)
+        if best[0] is not None:
+            co[i] = best[0]
+
+    # back to the lowpoly's local space
+    co = (co - matrix[:3, 3]) @ np.linalg.inv(matrix[:3, :3]).T
+    mesh.vertices.foreach_set("co", co.astype(np.float32).ravel())
+    mesh.update()
+
+
+def get_world_vertices(mesh, matrix):
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+    normals = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("normal", normals)
+    co = co.reshape(-1, 3) @ matrix[:3, :3].T + matrix[:3, 3]
+    normals = normals.reshape(-1, 3) @ np.linalg.inv(matrix[:3, :3])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    lengths[lengths == 0] = 1
+    return co, normals / lengths
+
+
 def bake(bake_type, highpoly, lowpoly):
     props = get_props()
     bake_method = props.bake_method
     remesher = props.remesher
 
     # check if multires normal baking should be done
-    is_bake_multires = remesher != "NONE" and bake_type == "NORMAL"
+    is_bake_multires = (
+        remesher != "NONE"
+        and bake_type == "NORMAL"
+        and props.detail_method == "MULTIRES"
+        and props.detail_level > 0
+        and any(modifier.type == "MULTIRES" for modifier in lowpoly.modifiers)
+    )
 
-    # select objects for baking
+    # objects for baking are passed to the operator instead of selected
+    selected = []
     if bake_method == "TRANSFER" and not is_bake_multires:
-        highpoly.select_set(True)
-    set_active(lowpoly)
+        selected.append(highpoly)
 
     # bake
     if is_bake_multires:
         # multires bake (only for normals)
         bpy.context.scene.render.use_bake_multires = True
         bpy.context.scene.render.bake_type = "NORMALS"
-        bpy.ops.object.bake_image()
+        # the multires bake finds its objects through the view layer bases
+        with stats.stage("bake_multires_normal", lowpoly):
+            with view_layer_selection([lowpoly]), object_override(lowpoly):
+                bpy.ops.object.bake_image()
         bpy.context.scene.render.use_bake_multires = False
     else:
         # regular bake
-        bpy.ops.object.bake(type=bake_type)
+        with stats.stage("bake_" + bake_type.lower(), lowpoly) as record:
+            record["samples"] = bpy.context.scene.cycles.samples
+            with object_override(lowpoly, selected):
+                bpy.ops.object.bake(type=bake_type)
+
+
+def bake_adaptive(bake_type, highpoly, lowpoly, image):
+    # bake with as few samples as the map needs and return the samples used
+    props = get_props()
+    cycles = bpy.context.scene.cycles
+
+    if props.sample_mode == "SCENE":
+        bake(bake_type, highpoly, lowpoly)
+        return cycles.samples
+
+    scene_samples = cycles.samples
+    scene_seed = cycles.seed
+    samples = min(BASE_SAMPLES.get(bake_type, 1), props.max_samples)
+    try:
+        cycles.samples = samples
+        bake(bake_type, highpoly, lowpoly)
+        if bake_type not in NOISY_BAKE_TYPES:
+            return samples
+
+        # add batches with new seeds until no tile changes anymore
+        width, height = image.size
+        mean = np.empty(width * height * 4, dtype=np.float32)
+        image.pixels.foreach_get(mean)
+        batch = np.empty_like(mean)
+        total = samples
+        while total < props.max_samples:
+            count = min(total, props.max_samples - total)
+            cycles.samples = count
+            cycles.seed += 1
+            bake(bake_type, highpoly, lowpoly)
+            image.pixels.foreach_get(batch)
+
+            combined = (mean * total + batch * count) / (total + count)
+            change = calc_max_tile_change(mean, combined, width, height)
+            mean = combined
+            total += count
+            if change < props.noise_threshold:
+                break
+
+        image.pixels.foreach_set(mean)
+        image.update()
+        return total
+    finally:
+        cycles.samples = scene_samples
+        cycles.seed = scene_seed
+
+
+def calc_max_tile_change(old, new, width, height, tile=64):
+    # largest mean change of any tile, noise hides in small areas
+    tile = min(tile, width, height)
+    diff = np.abs(new - old).reshape(height, width, 4)[:, :, :3].mean(axis=2)
+    diff = diff[: height - height % tile, : width - width % tile]
+    tiles = diff.reshape(height // tile, tile, width // tile, tile)
+    return float(tiles.mean(axis=(1, 3)).max())
 
 
 def copy_obj(object):
@@ -127,12 +539,100 @@ def copy_obj(object):
     # copy data so new obj is not an instance
     new.data = object.data.copy()
     new.animation_data_clear()
-    bpy.context.collection.objects.link(new)
-    deselect_all()
-    set_active(new)
+    get_collection(object).objects.link(new)
     return new
 
 
+def get_collection(object):
+    # collection that new objects made from this object are linked to
+    if object.users_collection:
+        return object.users_collection[0]
+    return bpy.context.scene.collection
+
+
+def join_objects(objects, name):
+    # one object in world space made of the evaluated meshes of all objects
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    bm = bmesh.new()
+    materials = []
+    offsets = []
+    for obj in objects:
+        mesh = bpy.data.meshes.new_from_object(
+            obj.evaluated_get(depsgraph),
+            preserve_all_data_layers=True,
+            depsgraph=depsgraph,
+        )
+        mesh.transform(obj.matrix_world)
+        # material indices are moved past the materials of the previous objects
+        offsets.append((len(materials), len(mesh.polygons)))
+        materials.extend(list(mesh.materials) or [None])
+        bm.from_mesh(mesh)
+        bpy.data.meshes.remove(mesh)
+
+    mesh = bpy.data.meshes.new(name)
+    bm.to_mesh(mesh)
+    bm.free()
+    for material in materials:
+        mesh.materials.append(material)
+    indices = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("material_index", indices)
+    starts, counts = np.array(offsets, dtype=np.int32).reshape(-1, 2).T
+    indices += np.repeat(starts, counts)
+    mesh.polygons.foreach_set("material_index", indices)
+
+    joined = bpy.data.objects.new(name, mesh)
+    get_collection(objects[0]).objects.link(joined)
+    return joined
+
+
+def set_single_material_slot(mesh):
+    # one empty slot that all faces use
+    mesh.materials.clear()
+    mesh.materials.append(None)
+    indices = np.zeros(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_set("material_index", indices)
+
+
+def remove_object(obj):
+    mesh = obj.data
+    bpy.data.objects.remove(obj, do_unlink=True)
+    if mesh.users == 0:
+        bpy.data.meshes.remove(mesh)
+
+
+def object_override(object, selected=(), **kwargs):
+    # context for the few operators that have no data level equivalent
+    # the object is active and selected without touching the view layer
+    selected = [object, *selected]
+    return bpy.context.temp_override(
+        object=object,
+        active_object=object,
+        selected_objects=selected,
+        selected_editable_objects=selected,
+        **kwargs,
+    )
+
+
+def apply_modifiers(object):
+    # replace the mesh with the evaluated mesh, like applying the whole stack
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    evaluated = object.evaluated_get(depsgraph)
+    mesh = bpy.data.meshes.new_from_object(
+        evaluated, preserve_all_data_layers=True, depsgraph=depsgraph
+    )
+    old = object.data
+    object.modifiers.clear()
+    object.data = mesh
+    if old.users == 0:
+        bpy.data.meshes.remove(old)
+    mesh.name = object.name
+
+
+def shade_smooth(mesh):
+    mesh.polygons.foreach_set("use_smooth", np.ones(len(mesh.polygons), dtype=bool))
+    mesh.update()
+
+
 def deselect_all():
     for obj in bpy.context.selected_objects:
         obj.select_set(False)
@@ -143,5 +643,31 @@ def set_active(object):
     bpy.context.view_layer.objects.active = object
 
 
+def get_baked_images(obj):
+    # images used by the lowpoly's autolow material
+    material = obj.active_material
+    if material is None or not material.use_nodes:
+        return []
+    return [
+        node.image
+        for node in material.node_tree.nodes
+        if node.type == "TEX_IMAGE" and node.image is not None
+    ]
+
+
 def get_props():
     return bpy.context.scene.autolow_props
+
+
+@contextmanager
+def override_settings(settings):
+    # set some settings while the block runs and restore them afterwards
+    props = get_props()
+    old = {key: getattr(props, key) for key in settings}
+    for key, value in settings.items():
+        setattr(props, key, value)
+    try:
+        yield
+    finally:
+        for key, value in old.items():
+            setattr(props, key, value)
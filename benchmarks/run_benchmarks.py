@@ -0,0 +1,247 @@
+import bmesh
+import bpy
+import argparse
+import importlib.util
+import json
+import numpy as np
+import pathlib
+import platform
+import sys
+import time
+
+
+# benchmark suite for AutoLow
+#
+# usage:
+# blender -b --factory-startup --python benchmarks/run_benchmarks.py --
+#     [--out bench_output.jsonl] [--sizes small,medium] [--resolutions 512,1024]
+#
+# every run appends one json line to the output file so results can be
+# compared over time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+# subdivision levels of the fixtures, faces grow by 4x per level
+SIZES = {"small": 3, "medium": 5, "large": 6, "huge": 7}
+REMESHERS = ("VOXEL", "QUAD", "DECIMATE")
+RESOLUTIONS = ("512", "1024", "2048")
+
+
+def load_addon():
+    # import the addon from this repository, whatever its folder is called
+    spec = importlib.util.spec_from_file_location(
+        "autolow", ROOT / "__init__.py", submodule_search_locations=[str(ROOT)]
+    )
+    addon = importlib.util.module_from_spec(spec)
+    sys.modules["autolow"] = addon
+    spec.loader.exec_module(addon)
+    addon.register()
+    return addon
+
+
+def parse_args():
+    argv = sys.argv
+    argv = argv[argv.index("--") + 1 :] if "--" in argv else []
+    parser = argparse.ArgumentParser(prog="run_benchmarks.py")
+    parser.add_argument("--out", default=str(ROOT / "bench_output.jsonl"))
+    parser.add_argument("--sizes", default="small,medium")
+    parser.add_argument("--remeshers", default=",".join(REMESHERS))
+    parser.add_argument("--resolutions", default=",".join(RESOLUTIONS))
+    return parser.parse_args(argv)
+
+
+# fixtures
+
+
+def displace(coords, amount):
+    # deterministic bumpy displacement along the direction from the center
+    x, y, z = coords[:, 0], coords[:, 1], coords[:, 2]
+    noise = (
+        np.sin(x * 7.1) * np.sin(y * 5.3) * np.sin(z * 6.7)
+        + 0.5 * np.sin(x * 23.0 + y * 17.0)
+        + 0.25 * np.sin(z * 41.0 - x * 29.0)
+    )
+    lengths = np.linalg.norm(coords, axis=1, keepdims=True)
+    lengths[lengths == 0] = 1
+    return coords + coords / lengths * (noise[:, None] * amount)
+
+
+def new_fixture(name, level, broken=False):
+    bm = bmesh.new()
+    bmesh.ops.create_icosphere(bm, subdivisions=2, radius=1)
+    mesh = bpy.data.meshes.new(name)
+    bm.to_mesh(mesh)
+    bm.free()
+
+    obj = bpy.data.objects.new(name, mesh)
+    bpy.context.collection.objects.link(obj)
+
+    # subdivide to the requested density
+    subsurf = obj.modifiers.new("Subdivision", "SUBSURF")
+    subsurf.levels = level
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    dense = bpy.data.meshes.new_from_object(obj.evaluated_get(depsgraph))
+    obj.modifiers.clear()
+    obj.data = dense
+    bpy.data.meshes.remove(mesh)
+
+    coords = np.empty(len(dense.vertices) * 3, dtype=np.float32)
+    dense.vertices.foreach_get("co", coords)
+    coords = displace(coords.reshape(-1, 3), 0.05)
+    dense.vertices.foreach_set("co", coords.ravel())
+
+    if broken:
+        # holes and loose vertices like a raw scan, quadriflow fails on these
+        rng = np.random.default_rng(0)
+        bm = bmesh.new()
+        bm.from_mesh(dense)
+        bm.faces.ensure_lookup_table()
+        count = max(1, len(bm.faces) // 200)
+        faces = [bm.faces[i] for i in set(rng.integers(0, len(bm.faces), count))]
+        bmesh.ops.delete(bm, geom=faces, context="FACES_ONLY")
+        for co in rng.uniform(-1.2, 1.2, (50, 3)):
+            bm.verts.new(co)
+        bm.to_mesh(dense)
+        bm.free()
+
+    dense.update()
+    return obj
+
+
+def new_fixtures(sizes):
+    fixtures = []
+    for size in sizes:
+        level = SIZES[size]
+        fixtures.append(new_fixture("sphere_" + size, level))
+        fixtures.append(new_fixture("scan_" + size, level, broken=True))
+    return fixtures
+
+
+# benchmarks
+
+
+def setup_scene():
+    scene = bpy.context.scene
+    scene.render.engine = "CYCLES"
+    scene.cycles.device = "CPU"
+    scene.cycles.samples = 1
+
+    props = scene.autolow_props
+    props.autosave = False
+    props.is_image_saved = False
+    props.unwrap_method = "SMART"
+    props.bake_method = "TRANSFER"
+    props.cage_settings = "AUTO"
+    return props
+
+
+def remove_material(lowpoly):
+    # remove the baked material and its images
+    if lowpoly.active_material is not None:
+        for node in lowpoly.active_material.node_tree.nodes:
+            if node.type == "TEX_IMAGE" and node.image is not None:
+                bpy.data.images.remove(node.image)
+        bpy.data.materials.remove(lowpoly.active_material)
+
+
+def remove_lowpoly(lowpoly):
+    remove_material(lowpoly)
+    mesh = lowpoly.data
+    bpy.data.objects.remove(lowpoly)
+    bpy.data.meshes.remove(mesh)
+
+
+def time_call(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def run_case(addon, highpoly, remesher, resolutions):
+    main = addon.autolow_main
+    utils = addon.autolow_utils
+    stats = addon.autolow_stats
+    props = bpy.context.scene.autolow_props
+    props.remesher = remesher
+
+    stats.reset()
+    stats.begin_object(highpoly.name)
+    faces = len(highpoly.data.polygons)
+
+    lowpoly = utils.copy_obj(highpoly)
+    lowpoly.name = highpoly.name + "_LP"
+    remesh_seconds, lowpoly = time_call(main.remesh_process, highpoly, lowpoly)
+    unwrap_seconds, _ = time_call(main.uv_unwrap_process, lowpoly)
+
+    result = {
+        "fixture": highpoly.name,
+        "remesher": remesher,
+        "faces_in": faces,
+        "faces_out": len(lowpoly.data.polygons),
+        "remesh_seconds": round(remesh_seconds, 4),
+        "remesh_faces_per_second": round(faces / max(remesh_seconds, 1e-9)),
+        "unwrap_seconds": round(unwrap_seconds, 4),
+        "bakes": [],
+    }
+
+    maps = sum(getattr(props, m.prop) for m in main.BAKE_MAPS)
+    for resolution in resolutions:
+        props.resolution = resolution
+        bake_seconds, _ = time_call(main.bake_process, highpoly, lowpoly)
+        texels = int(resolution) ** 2 * maps
+        result["bakes"].append(
+            {
+                "resolution": int(resolution),
+                "seconds": round(bake_seconds, 4),
+                "texels_per_second": round(texels / max(bake_seconds, 1e-9)),
+            }
+        )
+        # every resolution starts without the previous bake
+        remove_material(lowpoly)
+
+    result["stages"] = list(stats.records)
+    remove_lowpoly(lowpoly)
+    return result
+
+
+def main():
+    args = parse_args()
+    addon = load_addon()
+
+    # start from an empty scene
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj)
+    setup_scene()
+
+    sizes = args.sizes.split(",")
+    remeshers = args.remeshers.split(",")
+    resolutions = args.resolutions.split(",")
+
+    run = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "blender": bpy.app.version_string,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "threads": bpy.context.scene.render.threads,
+        "settings": {"sizes": sizes, "remeshers": remeshers},
+        "results": [],
+    }
+
+    for highpoly in new_fixtures(sizes):
+        for remesher in remeshers:
+            result = run_case(addon, highpoly, remesher, resolutions)
+            run["results"].append(result)
+            print(
+                "{fixture} {remesher}: remesh {remesh_seconds}s,"
+                " unwrap {unwrap_seconds}s".format(**result)
+            )
+            for bake in result["bakes"]:
+                print("  bake {resolution}px: {seconds}s".format(**bake))
+
+    with open(args.out, "a") as file:
+        file.write(json.dumps(run) + "\n")
+    print("Results appended to " + args.out)
+
+
+if __name__ == "__main__":
+    main()